@@ -0,0 +1,91 @@
+# benchmark.py
+# ------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Throughput benchmarks for the game engine.
+
+  python benchmark.py --layout originalClassic --numGames 5
+
+plays quiet games through game.Game.run and reports how many turns (single
+agent moves) per second the engine sustains.  Use a cheap Pacman agent (the
+default GreedyAgent) to measure engine overhead rather than search time.
+"""
+import random
+import sys
+import time
+
+import layout
+import pacman
+import textDisplay
+
+
+def benchmarkTurns(lay, pacmanAgent, ghostAgents, numGames=1, seed=0, readOnlyObservations=False):
+    """
+    Plays numGames quiet games and returns (turns, seconds).
+    """
+    rules = pacman.ClassicGameRules()
+    turns = 0
+    elapsed = 0.0
+    for i in range(numGames):
+        random.seed(seed + i)
+        game = rules.newGame(lay, pacmanAgent, ghostAgents,
+                             textDisplay.NullGraphics(), quiet=True,
+                             readOnlyObservations=readOnlyObservations)
+        start = time.perf_counter()
+        game.run()
+        elapsed += time.perf_counter() - start
+        turns += len(game.moveHistory)
+    return turns, elapsed
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE:      python benchmark.py <options>')
+    parser.add_option('-l', '--layout', dest='layout', default='originalClassic',
+                      help=pacman.default('the LAYOUT_FILE to play on'))
+    parser.add_option('-p', '--pacman', dest='pacman', default='GreedyAgent',
+                      help=pacman.default('the agent TYPE in the pacmanAgents module to use'))
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
+    parser.add_option('-g', '--ghosts', dest='ghost', default='RandomGhost',
+                      help=pacman.default('the ghost agent TYPE in the ghostAgents module to use'))
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=4,
+                      help=pacman.default('The maximum number of ghosts to use'))
+    parser.add_option('-n', '--numGames', type='int', dest='numGames', default=3,
+                      help=pacman.default('the number of GAMES to play'))
+    parser.add_option('-s', '--seed', type='int', dest='seed', default=0,
+                      help=pacman.default('random seed of the first game'))
+    parser.add_option('--readOnlyObservations', action='store_true', dest='readOnlyObservations',
+                      help='Hand agents read-only views of the game state instead of copies', default=False)
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    lay = layout.getLayout(options.layout)
+    if lay == None:
+        raise Exception("The layout " + options.layout + " cannot be found")
+    pacmanType = pacman.loadAgent(options.pacman, True)
+    ghostType = pacman.loadAgent(options.ghost, True)
+    pacmanAgent = pacmanType(**pacman.parseAgentArgs(options.agentArgs))
+    ghostAgents = [ghostType(i + 1) for i in range(options.numGhosts)]
+
+    turns, elapsed = benchmarkTurns(lay, pacmanAgent, ghostAgents,
+                                    options.numGames, options.seed,
+                                    options.readOnlyObservations)
+    print('%s on %s: %d turns in %.2fs (%.1f turns/second)' % (
+        options.pacman, options.layout, turns, elapsed, turns / elapsed))
@@ -25,6 +25,7 @@ import time
 import os
 import traceback
 import sys
+import hashlib
 
 #######################
 # Parts worth reading #
@@ -80,6 +81,8 @@ class Configuration:
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
     """
+    # Search creates one of these for every move, so skip the per-instance __dict__
+    __slots__ = ('pos', 'direction')
 
     def __init__(self, pos, direction):
         self.pos = pos
@@ -128,6 +131,8 @@ class AgentState:
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
     """
+    __slots__ = ('start', 'configuration', 'isPacman', 'scaredTimer',
+                 'numCarrying', 'numReturned')
 
     def __init__(self, startConfiguration, isPacman):
         self.start = startConfiguration
@@ -160,6 +165,15 @@ class AgentState:
         state.numReturned = self.numReturned
         return state
 
+    def readOnlyCopy(self):
+        """
+        Returns a copy of this state whose attributes cannot be assigned; its
+        copy() is an ordinary AgentState again.
+        """
+        state = self.copy()
+        state.__class__ = ReadOnlyAgentState
+        return state
+
     def getPosition(self):
         if self.configuration == None:
             return None
@@ -169,6 +183,17 @@ class AgentState:
         return self.configuration.getDirection()
 
 
+class ReadOnlyAgentState(AgentState):
+    """
+    An AgentState made by AgentState.readOnlyCopy, for read-only views of a
+    game state.  Assigning to it raises an exception.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError('The agent states of a read-only view cannot be changed; copy() them first')
+
+
 class Grid:
     """
     A 2-dimensional array of objects backed by a list of lists.  Data is accessed
@@ -262,7 +287,7 @@ class Grid:
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -293,6 +318,163 @@ class Grid:
         return bools
 
 
+class BitGrid(Grid):
+    """
+    A Grid of booleans packed into a single Python int, one bit per cell.
+
+    Cell (x, y) is bit x * height + y, so column x is a contiguous run of
+    bits and asList() returns cells in the same order as Grid.asList().
+    grid[x][y] reads and writes go through a lightweight column view.
+
+    Because the int is immutable, copy() is O(1), count() is a popcount and
+    asList() only visits the cells that are set.  Unlike Grid.shallowCopy,
+    copies never share writes with the original.
+    """
+
+    def __init__(self, width, height, initialValue=False, bitRepresentation=None):
+        if initialValue not in [False, True]:
+            raise Exception('Grids can only contain booleans')
+        self.CELLS_PER_INT = 30
+
+        self.width = width
+        self.height = height
+        self.bits = 0
+        if initialValue:
+            self.bits = (1 << (width * height)) - 1
+        if bitRepresentation:
+            self._unpackBits(bitRepresentation)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.width
+        if i < 0 or i >= self.width:
+            raise IndexError('BitGrid column index out of range')
+        return BitGridColumn(self, i)
+
+    def __setitem__(self, key, item):
+        column = self[key]
+        for y, value in enumerate(item):
+            column[y] = value
+
+    def __str__(self):
+        out = [[str(self[x][y])[0] for x in range(self.width)]
+               for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None:
+            return False
+        if isinstance(other, BitGrid):
+            return self.bits == other.bits and self.width == other.width and self.height == other.height
+        return self.data == other.data
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    @property
+    def data(self):
+        """
+        The grid as a (freshly built) list of lists, for code that expects
+        Grid.data.  Writes to it do not affect the grid.
+        """
+        return [[self[x][y] for y in range(self.height)] for x in range(self.width)]
+
+    def copy(self):
+        g = BitGrid(self.width, self.height)
+        g.bits = self.bits
+        return g
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        return self.copy()
+
+    def readOnlyCopy(self):
+        """
+        Returns a ReadOnlyBitGrid with the same cells, in O(1).
+        """
+        g = ReadOnlyBitGrid(self.width, self.height)
+        g.bits = self.bits
+        return g
+
+    def count(self, item=True):
+        ones = bin(self.bits).count('1')
+        if item:
+            return ones
+        return self.width * self.height - ones
+
+    def asList(self, key=True):
+        if key != True:
+            return Grid.asList(self, key)
+        list = []
+        height = self.height
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            index = lowest.bit_length() - 1
+            list.append((index // height, index % height))
+            bits ^= lowest
+        return list
+
+
+class BitGridColumn:
+    """
+    The view returned by BitGrid[x]; indexing it with y reads or writes the
+    bit for cell (x, y).
+    """
+    __slots__ = ('grid', 'offset')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.offset = x * grid.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.grid.height
+        if y < 0 or y >= self.grid.height:
+            raise IndexError('BitGrid row index out of range')
+        return (self.grid.bits >> (self.offset + y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        if y < 0:
+            y += self.grid.height
+        if y < 0 or y >= self.grid.height:
+            raise IndexError('BitGrid row index out of range')
+        if value:
+            self.grid.bits |= 1 << (self.offset + y)
+        else:
+            self.grid.bits &= ~(1 << (self.offset + y))
+
+    def __len__(self):
+        return self.grid.height
+
+
+class ReadOnlyBitGrid(BitGrid):
+    """
+    A BitGrid whose cells cannot be set; writing one raises an exception.
+    Its copies are ordinary BitGrids.
+    """
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.width
+        if i < 0 or i >= self.width:
+            raise IndexError('BitGrid column index out of range')
+        return ReadOnlyBitGridColumn(self, i)
+
+    def __setitem__(self, key, item):
+        raise TypeError('A read-only grid cannot be changed; copy() it first')
+
+
+class ReadOnlyBitGridColumn(BitGridColumn):
+    __slots__ = ()
+
+    def __setitem__(self, y, value):
+        raise TypeError('A read-only grid cannot be changed; copy() it first')
+
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1, 2)):
         return bitRep
@@ -304,6 +486,58 @@ def reconstituteGrid(bitRep):
 ####################################
 
 
+class ZobristKeys:
+    """
+    Hands out a fixed pseudo-random 64-bit key for each feature of a game
+    state (an agent's configuration, a scared timer, a food pellet, a
+    capsule).
+
+    A state's Zobrist hash is the XOR of the keys of the features it
+    contains, so a move that changes a few features updates the hash with a
+    few XORs instead of rehashing the whole board.  Each key is a hash of
+    the feature itself, with numbers written as floats so that (3, 2) and
+    (3.0, 2.0) get the same key, so a state hashes the same in every process
+    and after pickling, whatever order the features were first seen in.
+    """
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.keys = {}
+
+    def key(self, feature):
+        k = self.keys.get(feature)
+        if k is None:
+            text = repr((self.seed, canonicalFeature(feature))).encode()
+            k = self.keys[feature] = int.from_bytes(
+                hashlib.blake2b(text, digest_size=8).digest(), 'little')
+        return k
+
+    def agentKey(self, agentIndex, agentState):
+        conf = agentState.configuration
+        return self.key(('agent', agentIndex, conf.pos, conf.direction)) ^ \
+            self.key(('scared', agentIndex, agentState.scaredTimer))
+
+    def foodKey(self, position):
+        return self.key(('food', position))
+
+    def capsuleKey(self, position):
+        return self.key(('capsule', position))
+
+
+def canonicalFeature(feature):
+    """
+    Returns feature with every number in it converted to a float.
+    """
+    if isinstance(feature, tuple):
+        return tuple([canonicalFeature(part) for part in feature])
+    if isinstance(feature, (int, float)) and not isinstance(feature, bool):
+        return float(feature)
+    return feature
+
+
+ZOBRIST = ZobristKeys()
+
+
 class Actions:
     """
     A collection of static methods for manipulating move actions.
@@ -369,6 +603,18 @@ class Actions:
 
     getPossibleActions = staticmethod(getPossibleActions)
 
+    def getGhostActions(possibleActions, direction):
+        """
+        Filters possible actions down to the ones a ghost may take: ghosts
+        cannot stop, and cannot turn around unless they reach a dead end.
+        """
+        reverse = Actions.reverseDirection(direction)
+        ghostActions = [a for a in possibleActions if a != Directions.STOP]
+        if reverse in ghostActions and len(ghostActions) > 1:
+            ghostActions.remove(reverse)
+        return ghostActions
+    getGhostActions = staticmethod(getGhostActions)
+
     def getLegalNeighbors(position, walls):
         x, y = position
         x_int, y_int = int(x + 0.5), int(y + 0.5)
@@ -394,18 +640,29 @@ class Actions:
 
 
 class GameStateData:
+    __slots__ = ('food', 'capsules', 'agentStates', 'layout', 'score', 'scoreChange',
+                 '_eaten', '_hash', '_numFood', '_foodList', '_foodEaten',
+                 '_foodAdded', '_capsuleEaten', '_agentMoved', '_lose', '_win')
 
     def __init__(self, prevState=None):
         """
         Generates a new data packet by copying information from its predecessor.
+
+        The food grid, the capsule list and the AgentStates themselves are
+        shared with the predecessor, since a move changes few of them.  Code
+        that changes one replaces it first: food with food.copy(), capsules
+        with a new list and an agent's state with copyAgentState.
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates(prevState.agentStates)
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.agentStates = prevState.agentStates[:]
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._hash = prevState._hash
+            self._numFood = prevState._numFood
+            self._foodList = prevState._foodList
 
         self._foodEaten = None
         self._foodAdded = None
@@ -418,13 +675,76 @@ class GameStateData:
     def deepCopy(self):
         state = GameStateData(self)
         state.food = self.food.deepCopy()
-        state.layout = self.layout.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates(self.agentStates)
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
         state._capsuleEaten = self._capsuleEaten
         return state
 
+    def readOnlyCopy(self):
+        """
+        Returns a ReadOnlyGameStateData with the same contents as this one.
+        The food grid and the agent states are read-only copies, which are
+        cheap to make and raise an exception if changed, and the short lists
+        are copied, so nothing changed in place reaches this one.
+        """
+        state = GameStateData.__new__(GameStateData)
+        if isinstance(self.food, BitGrid):
+            state.food = self.food.readOnlyCopy()
+        else:
+            state.food = self.food.copy()
+        state.capsules = self.capsules[:]
+        state.agentStates = [agentState.readOnlyCopy() for agentState in self.agentStates]
+        state.layout = self.layout
+        state.score = self.score
+        state.scoreChange = self.scoreChange
+        state._eaten = self._eaten[:]
+        state._hash = self._hash
+        state._numFood = self._numFood
+        state._foodList = self._foodList
+        state._foodEaten = self._foodEaten
+        state._foodAdded = self._foodAdded
+        state._capsuleEaten = self._capsuleEaten
+        state._agentMoved = self._agentMoved
+        state._lose = self._lose
+        state._win = self._win
+        state.__class__ = ReadOnlyGameStateData
+        return state
+
+    def agentHash(self, agentIndex):
+        """
+        The Zobrist key of one agent's configuration and scared timer.
+
+        Code that changes an agent XORs this into self._hash once before and
+        once after the change.
+        """
+        return ZOBRIST.agentKey(agentIndex, self.agentStates[agentIndex])
+
+    def computeHash(self):
+        """
+        Computes the Zobrist hash of the agents, food and capsules from
+        scratch.  Successor states update it incrementally instead.
+        """
+        h = 0
+        for index in range(len(self.agentStates)):
+            h ^= self.agentHash(index)
+        for position in self.food.asList():
+            h ^= ZOBRIST.foodKey(position)
+        for position in self.capsules:
+            h ^= ZOBRIST.capsuleKey(position)
+        return h
+
+    def copyAgentState(self, agentIndex):
+        """
+        Replaces an agent's state, which may be shared with other states, by
+        a copy of its own and returns the copy, ready to be changed.
+        """
+        agentState = self.agentStates[agentIndex].copy()
+        self.agentStates[agentIndex] = agentState
+        return agentState
+
     def copyAgentStates(self, agentStates):
         copiedStates = []
         for agentState in agentStates:
@@ -452,13 +772,7 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate(self.agentStates):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                # hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113 * hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575)
+        return hash((self._hash, self.score))
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
@@ -519,6 +833,8 @@ class GameStateData:
         Creates an initial game state from a layout array (see layout.py).
         """
         self.food = layout.food.copy()
+        self._foodList = tuple(self.food.asList())
+        self._numFood = len(self._foodList)
         #self.capsules = []
         self.capsules = layout.capsules[:]
         self.layout = layout
@@ -536,6 +852,24 @@ class GameStateData:
             self.agentStates.append(AgentState(
                 Configuration(pos, Directions.STOP), isPacman))
         self._eaten = [False for a in self.agentStates]
+        self._hash = self.computeHash()
+
+
+class ReadOnlyGameStateData(GameStateData):
+    """
+    A GameStateData made by GameStateData.readOnlyCopy, whose food grid and
+    agent states cannot be changed in place.  Its first attribute assignment
+    gives it ordinary copies of those (copy-on-write) and turns it into a
+    plain GameStateData, so that it can then be changed like any other.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, '__class__', GameStateData)
+        self.food = self.food.deepCopy()
+        self.capsules = self.capsules[:]
+        self.agentStates = self.copyAgentStates(self.agentStates)
+        setattr(self, name, value)
 
 
 try:
@@ -550,7 +884,8 @@ class Game:
     The Game manages the control flow, soliciting actions from agents.
     """
 
-    def __init__(self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False):
+    def __init__(self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False,
+                 readOnlyObservations=False):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -559,6 +894,7 @@ class Game:
         self.gameOver = False
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
+        self.readOnlyObservations = readOnlyObservations
         self.moveHistory = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
@@ -580,6 +916,16 @@ class Game:
         self.agentCrashed = True
         self.rules.agentCrash(self, agentIndex)
 
+    def copyState(self):
+        """
+        The copy of the state handed to agents: a deep copy, or with
+        readOnlyObservations a read-only view sharing the state's data, which
+        costs the same whatever the size of the board.
+        """
+        if self.readOnlyObservations:
+            return self.state.makeReadOnlyView()
+        return self.state.deepCopy()
+
     OLD_STDOUT = None
     OLD_STDERR = None
 
@@ -625,10 +971,10 @@ class Game:
                 if self.catchExceptions:
                     try:
                         timed_func = TimeoutFunction(
-                            agent.registerInitialState, int(self.rules.getMaxStartupTime(i)))
+                            agent.registerInitialState, self.rules.getMaxStartupTime(i))
                         try:
                             start_time = time.time()
-                            timed_func(self.state.deepCopy())
+                            timed_func(self.copyState())
                             time_taken = time.time() - start_time
                             self.totalAgentTimes[i] += time_taken
                         except TimeoutFunctionException:
@@ -643,7 +989,7 @@ class Game:
                         self.unmute()
                         return
                 else:
-                    agent.registerInitialState(self.state.deepCopy())
+                    agent.registerInitialState(self.copyState())
                 # TODO: could this exceed the total time
                 self.unmute()
 
@@ -660,11 +1006,11 @@ class Game:
                 self.mute(agentIndex)
                 if self.catchExceptions:
                     try:
-                        timed_func = TimeoutFunction(agent.observationFunction, int(
-                            self.rules.getMoveTimeout(agentIndex)))
+                        timed_func = TimeoutFunction(agent.observationFunction,
+                            self.rules.getMoveTimeout(agentIndex))
                         try:
                             start_time = time.time()
-                            observation = timed_func(self.state.deepCopy())
+                            observation = timed_func(self.copyState())
                         except TimeoutFunctionException:
                             skip_action = True
                         move_time += time.time() - start_time
@@ -674,19 +1020,18 @@ class Game:
                         self.unmute()
                         return
                 else:
-                    observation = agent.observationFunction(
-                        self.state.deepCopy())
+                    observation = agent.observationFunction(self.copyState())
                 self.unmute()
             else:
-                observation = self.state.deepCopy()
+                observation = self.copyState()
 
             # Solicit an action
             action = None
             self.mute(agentIndex)
             if self.catchExceptions:
                 try:
-                    timed_func = TimeoutFunction(agent.getAction, int(
-                        self.rules.getMoveTimeout(agentIndex)) - int(move_time))
+                    timed_func = TimeoutFunction(agent.getAction,
+                        self.rules.getMoveTimeout(agentIndex) - move_time)
                     try:
                         start_time = time.time()
                         if skip_action:
@@ -776,3 +1121,35 @@ class Game:
                     self.unmute()
                     return
         self.display.finish()
+
+    def runHeadless(self):
+        """
+        Plays the game without a display, for bulk simulation.
+
+        Agents are asked for their actions in the same order as run(), so
+        games with the same random seed have the same outcome, but nothing
+        else is done between moves: there are no timeouts, no muting and no
+        display updates, and agents are handed the game state itself rather
+        than a copy, so they must not modify it.
+        """
+        self.numMoves = 0
+        for agent in self.agents:
+            if "registerInitialState" in dir(agent):
+                agent.registerInitialState(self.state)
+        observers = [getattr(agent, 'observationFunction', None) for agent in self.agents]
+
+        agentIndex = self.startingIndex
+        numAgents = len(self.agents)
+        while not self.gameOver:
+            observation = self.state
+            if observers[agentIndex] is not None:
+                observation = observers[agentIndex](self.state)
+            action = self.agents[agentIndex].getAction(observation)
+            self.moveHistory.append((agentIndex, action))
+            self.state = self.state.generateSuccessor(agentIndex, action)
+            self.rules.process(self.state, self)
+            agentIndex = (agentIndex + 1) % numAgents
+
+        for agent in self.agents:
+            if "final" in dir(agent):
+                agent.final(self.state)
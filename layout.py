@@ -13,30 +13,99 @@
 
 
 from util import manhattanDistance
+from util import nearestPoint
 from game import Grid
+from game import BitGrid
+from array import array
+from collections import deque
+import hashlib
+import mmap
 import os
 import random
+import tempfile
 from functools import reduce
 
 VISIBILITY_MATRIX_CACHE = {}
+LEGAL_ACTIONS_CACHE = {}
+MAZE_DISTANCE_CACHE = {}
+LAYOUT_TEXT_CACHE = {}
+
+# Stored in the maze distance table for cells that cannot reach each other
+UNREACHABLE = 0xFFFF
+
+# Directory where the per-layout tables are kept between runs (see
+# loadCachedTable); None keeps them in memory only
+CACHE_DIRECTORY = None
+
+# Part of the cache file names; bump it whenever the layout of a table
+# changes, so that files written by older code are not used
+CACHE_FORMAT = 1
+
+
+def setCacheDirectory(directory):
+    global CACHE_DIRECTORY
+    if directory is not None and not os.path.isdir(directory):
+        os.makedirs(directory)
+    CACHE_DIRECTORY = directory
+
+
+def loadCachedTable(layoutText, name, typecode, length, build):
+    """
+    Returns a flat table of length items of the given array typecode for a
+    layout, calling build() to compute it as an array.
+
+    With a cache directory set, the table is stored there in a file named by
+    a hash of the layout text and CACHE_FORMAT, and memory mapped, so the pages are shared by
+    every process using the layout and later runs skip build() entirely.
+    The result is then a read-only memoryview rather than an array.
+    """
+    if CACHE_DIRECTORY is None:
+        return build()
+    digest = hashlib.sha1("\n".join(layoutText).encode()).hexdigest()
+    path = os.path.join(CACHE_DIRECTORY, '%s.%s.v%d.%s' % (digest, name, CACHE_FORMAT, typecode))
+    size = length * array(typecode).itemsize
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        # Write under a temporary name so that other processes never map a
+        # partly written file
+        f = tempfile.NamedTemporaryFile(dir=CACHE_DIRECTORY, delete=False)
+        try:
+            try:
+                build().tofile(f)
+            finally:
+                f.close()
+        except:
+            os.remove(f.name)
+            raise
+        os.replace(f.name, path)
+    if size == 0:
+        return array(typecode)
+    with open(path, 'rb') as f:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(typecode)
 
 
 class Layout:
     """
     A Layout manages the static information about the game board.
+
+    Layouts are never modified once loaded, so every game state built from
+    one shares it rather than copying it.
     """
 
     def __init__(self, layoutText):
         self.width = len(layoutText[0])
         self.height = len(layoutText)
         self.walls = Grid(self.width, self.height, False)
-        self.food = Grid(self.width, self.height, False)
+        self.food = BitGrid(self.width, self.height, False)
         self.capsules = []
         self.agentPositions = []
         self.numGhosts = 0
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
+        self.initializeLegalActions()
+        # Built on the first getMazeDistance call
+        self.cellIndices = None
+        self.mazeDistances = None
         # self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
@@ -66,6 +135,127 @@ class Layout:
             self.visibility = VISIBILITY_MATRIX_CACHE[reduce(
                 str.__add__, self.layoutText)]
 
+    def getOpenCells(self):
+        """
+        The cells that are not walls, column by column.
+        """
+        return [(x, y) for x in range(self.width) for y in range(self.height)
+                if not self.walls[x][y]]
+
+    def initializeLegalActions(self):
+        """
+        Precomputes the legal actions of an agent standing on each open cell,
+        for every direction it could be facing, for both Pacman and ghosts.
+
+        The table is keyed on (position, direction, isPacman) and holds
+        tuples, so it can be shared freely.  Layouts with the same text share
+        a single table.  It is built from (and cached on disk as) one byte per
+        entry, a bitmask over Actions._directionsAsList.
+        """
+        global LEGAL_ACTIONS_CACHE
+        key = reduce(str.__add__, self.layoutText)
+        if key not in LEGAL_ACTIONS_CACHE:
+            from game import Actions
+            cells = self.getOpenCells()
+            directions = [direction for direction, vector in Actions._directionsAsList]
+            masks = loadCachedTable(self.layoutText, 'legal', 'B', len(cells) * len(directions) * 2,
+                                    lambda: self.computeLegalActionMasks(cells, directions))
+            decoded = {}
+            table = {}
+            i = 0
+            for cell in cells:
+                for direction in directions:
+                    for isPacman in [True, False]:
+                        mask = masks[i]
+                        if mask not in decoded:
+                            decoded[mask] = tuple(d for bit, d in enumerate(directions) if mask & (1 << bit))
+                        table[(cell, direction, isPacman)] = decoded[mask]
+                        i += 1
+            LEGAL_ACTIONS_CACHE[key] = table
+        self.legalActions = LEGAL_ACTIONS_CACHE[key]
+
+    def computeLegalActionMasks(self, cells, directions):
+        from game import Actions, Configuration
+        masks = array('B')
+        for cell in cells:
+            for direction in directions:
+                possible = Actions.getPossibleActions(Configuration(cell, direction), self.walls)
+                for actions in [possible, Actions.getGhostActions(possible, direction)]:
+                    masks.append(sum(1 << directions.index(action) for action in actions))
+        return masks
+
+    def getLegalActions(self, configuration, isPacman):
+        """
+        Returns a tuple of the legal actions for an agent with the given
+        configuration.  Agents between grid points (scared ghosts move at half
+        speed) are not in the table and must continue straight.
+        """
+        actions = self.legalActions.get(
+            (configuration.pos, configuration.direction, isPacman))
+        if actions is None:
+            from game import Actions
+            possible = Actions.getPossibleActions(configuration, self.walls)
+            if not isPacman:
+                possible = Actions.getGhostActions(possible, configuration.direction)
+            actions = tuple(possible)
+        return actions
+
+    def initializeMazeDistances(self):
+        """
+        Computes the shortest path length between every pair of open cells
+        by a breadth first search from each one.
+
+        Open cells are numbered in cellIndices and the distance from cell i
+        to cell j is mazeDistances[i * numCells + j], a flat table of
+        unsigned shorts holding UNREACHABLE where there is no path.  Layouts
+        with the same text share a single table, which loadCachedTable can
+        keep on disk.
+        """
+        global MAZE_DISTANCE_CACHE
+        key = reduce(str.__add__, self.layoutText)
+        if key not in MAZE_DISTANCE_CACHE:
+            cells = self.getOpenCells()
+            cellIndices = dict((cell, i) for i, cell in enumerate(cells))
+            distances = loadCachedTable(self.layoutText, 'distances', 'H', len(cells) * len(cells),
+                                        lambda: self.computeMazeDistances(cells, cellIndices))
+            MAZE_DISTANCE_CACHE[key] = (cellIndices, distances)
+        self.cellIndices, self.mazeDistances = MAZE_DISTANCE_CACHE[key]
+
+    def computeMazeDistances(self, cells, cellIndices):
+        neighbors = []
+        for x, y in cells:
+            neighbors.append([cellIndices[n] for n in [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
+                              if n in cellIndices])
+        numCells = len(cells)
+        distances = array('H', [UNREACHABLE]) * (numCells * numCells)
+        for source in range(numCells):
+            row = source * numCells
+            distances[row + source] = 0
+            queue = deque([source])
+            while queue:
+                cell = queue.popleft()
+                distance = distances[row + cell] + 1
+                for neighbor in neighbors[cell]:
+                    if distances[row + neighbor] == UNREACHABLE:
+                        distances[row + neighbor] = distance
+                        queue.append(neighbor)
+        return distances
+
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the length of the shortest path between two positions, or
+        infinity if there is none.  Positions between grid points (scared
+        ghosts) are rounded to the nearest cell.
+        """
+        if self.mazeDistances is None:
+            self.initializeMazeDistances()
+        i = self.cellIndices[nearestPoint(pos1)]
+        j = self.cellIndices[nearestPoint(pos2)]
+        distance = self.mazeDistances[i * len(self.cellIndices) + j]
+        if distance == UNREACHABLE:
+            return float('inf')
+        return distance
+
     def isWall(self, pos):
         x, col = pos
         return self.walls[x][col]
@@ -97,7 +287,14 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        # Layouts are immutable, so a copy can share everything
+        return self
+
+    def __reduce__(self):
+        # Pickle as the layout text alone, so game states sent to another
+        # process do not carry the walls, food and legal action tables; the
+        # receiving process parses each layout once and shares it
+        return (getLayoutFromText, (self.layoutText,))
 
     def processLayoutText(self, layoutText):
         """
@@ -154,6 +351,16 @@ def getLayout(name, back=2):
     return layout
 
 
+def getLayoutFromText(layoutText):
+    """
+    Returns a Layout for layoutText, shared by every caller with the same text.
+    """
+    key = "\n".join(layoutText)
+    if key not in LAYOUT_TEXT_CACHE:
+        LAYOUT_TEXT_CACHE[key] = Layout(list(layoutText))
+    return LAYOUT_TEXT_CACHE[key]
+
+
 def tryToLoad(fullname):
     if(not os.path.exists(fullname)):
         return None
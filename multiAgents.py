@@ -14,10 +14,17 @@
 
 from util import manhattanDistance
 from game import Directions
-import random, util
+import random, util, time
+import copy, math, multiprocessing
+import ghostAgents
 
 from game import Agent
-from pacman import GameState
+from pacman import GameState, COLLISION_TOLERANCE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class ReflexAgent(Agent):
     """
@@ -75,7 +82,7 @@ class ReflexAgent(Agent):
         newScaredTimes = [ghostState.scaredTimer for ghostState in newGhostStates]
 
         "*** YOUR CODE HERE ***"
-        distancesToFood = [manhattanDistance(newPos, food) for food in newFood.asList()]
+        distancesToFood = [manhattanDistance(newPos, food) for food in successorGameState.getFoodList()]
         if len(distancesToFood) > 0:
             closestDistanceToFood = min(distancesToFood)
         else:
@@ -110,6 +117,201 @@ def scoreEvaluationFunction(currentGameState: GameState):
     """
     return currentGameState.getScore()
 
+def scoreEvaluationBounds(currentGameState: GameState, depth):
+    """
+    Bounds on scoreEvaluationFunction for every state within depth rounds of
+    currentGameState, found by counting what Pacman could reach in time.
+    Pacman moves at most once a round, and he and a ghost close at most 2
+    apart a round, whatever the walls, so by Manhattan distance:
+
+    - He pays the time penalty each round and eats at most one pellet;
+      winning adds 500 if that can clear the food.
+    - He can eat a ghost (200) while it is scared, and again after each
+      capsule he eats, if it is within reach now or, after being eaten,
+      from its start position.
+    - Losing removes 500, but only if a ghost is within reach.
+
+    With depth 0 both bounds are the score.
+    """
+    score = currentGameState.getScore()
+    if depth == 0:
+        return (score, score)
+    x, y = currentGameState.getPacmanPosition()
+    reach = 2 * depth + COLLISION_TOLERANCE
+    numFood = currentGameState.getNumFood()
+    upper = score + 10 * min(depth, numFood)
+    if numFood <= depth:
+        upper += 500
+    # Read through data, since the accessors copy the capsules and agent
+    # states and this is called at every chance node
+    data = currentGameState.data
+    capsulesInReach = 0
+    for capsuleX, capsuleY in data.capsules:
+        if abs(capsuleX - x) + abs(capsuleY - y) <= depth:
+            capsulesInReach += 1
+    capsulesInReach = min(capsulesInReach, depth)
+    canLose = False
+    for ghostState in data.agentStates[1:]:
+        ghostX, ghostY = ghostState.configuration.pos
+        startX, startY = ghostState.start.pos
+        nearNow = abs(ghostX - x) + abs(ghostY - y) <= reach
+        nearStart = abs(startX - x) + abs(startY - y) <= reach
+        if nearNow or (capsulesInReach > 0 and nearStart):
+            canLose = True
+        if nearNow and (ghostState.scaredTimer > 0 or capsulesInReach > 0):
+            eats = 1
+            if nearStart:
+                # Each capsule makes it edible once more
+                eats += capsulesInReach
+                if ghostState.scaredTimer == 0:
+                    eats -= 1
+            upper += 200 * min(eats, depth)
+    lower = score - depth
+    if canLose:
+        lower -= 500
+    return (lower, upper)
+
+# An evaluation function can declare bounds(gameState, depth), a range that
+# holds its value on every state within depth rounds of gameState; with
+# depth 0 it is the range an infinite value on gameState itself is clamped
+# to.  The expectimax agent's Star1 pruning relies on it.
+scoreEvaluationFunction.bounds = scoreEvaluationBounds
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+class TranspositionTable:
+    """
+    A bounded cache of search results shared by the adversarial search agents.
+
+    Entries are keyed on (agentIndex, gameState), so two move orders that
+    reach the same position share one entry.  With the table on (ttSize > 0;
+    it is off by default) this is where duplicate states get merged: within
+    a single min or chance node they cannot arise, since each ghost action
+    leaves the ghost in a different configuration.
+
+    Each entry records the number of plies that were searched below the
+    state, the value that search produced, whether that value is EXACT or
+    only a LOWER_BOUND/UPPER_BOUND (alpha-beta cutoffs), and the best move
+    found.
+
+    Values are only reused for a search of exactly the same remaining depth,
+    so enabling the table never changes the value a search computes.  An
+    existing entry is replaced by a search at least as deep as the stored
+    one, or by any search once the entry has aged (see newGeneration); when
+    the table is full, the oldest entry is evicted.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.table = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def lookup(self, state, agentIndex, depth, alpha=float('-inf'), beta=float('inf')):
+        """
+        Returns (value, bestMove).  value is None unless the stored result
+        settles the search of state for the given depth and window.
+        """
+        entry = self.table.get((agentIndex, state))
+        if entry is None:
+            self.misses += 1
+            return None, None
+        entryDepth, value, flag, bestMove, generation = entry
+        if entryDepth == depth:
+            if flag == EXACT or (flag == LOWER_BOUND and value > beta) or (flag == UPPER_BOUND and value < alpha):
+                self.hits += 1
+                return value, bestMove
+        self.misses += 1
+        return None, bestMove
+
+    def store(self, state, agentIndex, depth, value, flag, bestMove=None):
+        key = (agentIndex, state)
+        entry = self.table.get(key)
+        if entry is not None:
+            if entry[0] > depth and entry[4] == self.generation:
+                return
+            # Re-insert so that the refreshed entry is the last to be evicted
+            del self.table[key]
+        elif len(self.table) >= self.size:
+            del self.table[next(iter(self.table))]
+            self.evictions += 1
+        self.table[key] = (depth, value, flag, bestMove, self.generation)
+        self.stores += 1
+
+    def newGeneration(self):
+        """
+        Marks the entries stored so far as old, for a table kept across
+        moves: they stay usable, but no longer block shallower results from
+        the new search, and the oldest are evicted first.
+        """
+        self.generation += 1
+
+    def clear(self):
+        self.table = {}
+
+    def getStats(self):
+        """
+        Returns the hit/miss counters as a dictionary.
+        """
+        probes = self.hits + self.misses
+        return {'entries': len(self.table), 'hits': self.hits, 'misses': self.misses,
+                'stores': self.stores, 'evictions': self.evictions,
+                'hitRate': self.hits / probes if probes else 0.0}
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when its time budget runs out.
+    """
+    pass
+
+# Fraction of the game's time limits that an anytime search will use
+ANYTIME_SAFETY = 0.8
+# When sharing out what is left of the game's total time, the game is taken
+# to have this many of Pacman's moves left per pellet, and never fewer than
+# ANYTIME_MIN_MOVES, so the budget shrinks well before the time runs out
+ANYTIME_MOVES_PER_FOOD = 2
+ANYTIME_MIN_MOVES = 20
+
+def parseFlag(value):
+    """
+    Interprets an agent argument such as 'True' or '1' (from -a) as a boolean.
+    """
+    return str(value).lower() in ['true', '1', 'yes']
+
+# The copy of the searching agent kept by each process of a parallel search
+# pool; see MultiAgentSearchAgent.parallelSearch
+SEARCH_WORKER_AGENT = None
+
+def initSearchWorker(agent):
+    """
+    Runs once in each pool process, before it searches anything.
+    """
+    global SEARCH_WORKER_AGENT
+    SEARCH_WORKER_AGENT = agent
+
+def searchRootAction(task):
+    """
+    Searches a single root action in a pool process.  Returns
+    (score, depthLimitReached, timedOut).
+    """
+    gameState, action, maxDepth, alpha, deadline = task
+    agent = SEARCH_WORKER_AGENT
+    agent.startSearch()
+    agent.depthLimitReached = False
+    agent.deadline = deadline
+    try:
+        score, _ = agent.search(gameState, maxDepth, [action], alpha)
+    except SearchTimeout:
+        return None, False, True
+    finally:
+        agent.deadline = None
+    return score, agent.depthLimitReached, False
+
 class MultiAgentSearchAgent(Agent):
     """
     This class provides some common elements to all of your
@@ -125,10 +327,340 @@ class MultiAgentSearchAgent(Agent):
     is another abstract class.
     """
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', ttSize = '0',
+                 anytime = 'False', moveTime = '0', maxDepth = '0', workers = '0',
+                 reuseTable = 'False', batchEval = 'False'):
         self.index = 0 # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        # A ttSize of 0 (the default) turns the transposition table off
+        self.transpositionTable = None
+        if int(ttSize) > 0:
+            self.transpositionTable = TranspositionTable(int(ttSize))
+        # With reuseTable on, the table is kept from one move to the next, so
+        # positions the previous move already searched (Pacman's and the
+        # ghosts' actual moves lead into its subtree) start with their values
+        self.reuseTable = parseFlag(reuseTable)
+        if self.reuseTable and self.transpositionTable is None:
+            raise Exception('reuseTable needs a transposition table (ttSize > 0)')
+        # Anytime mode deepens the search one ply at a time until the move's
+        # time budget is spent; depth is then ignored in favour of maxDepth
+        # (0 means no limit)
+        self.anytime = parseFlag(anytime)
+        self.moveTime = float(moveTime)
+        self.maxDepth = int(maxDepth)
+        self.moveTimeLimit = None
+        self.totalTimeLimit = None
+        self.timeUsed = 0.0
+        self.deadline = None
+        self.depthLimitReached = False
+        self.completedDepth = 0
+        # With more than one worker the root actions are searched in parallel
+        # by a pool of processes that lasts until the game is over (see final)
+        self.workers = int(workers)
+        self.pool = None
+        # With batchEval on, the last round above the depth limit is expanded
+        # in full and its leaves evaluated together (see evaluateLastRound)
+        self.batchEvaluation = parseFlag(batchEval)
+        # A searchStats.SearchStats, when the rules attach one
+        self.stats = None
+
+    def setMoveTimeLimit(self, seconds, totalSeconds=None):
+        """
+        Called by ClassicGameRules.newGame with the time this agent may take
+        per move and in the whole game.  The agent keeps count of the time
+        its moves take from then on.
+        """
+        self.moveTimeLimit = seconds
+        self.totalTimeLimit = totalSeconds
+        self.timeUsed = 0.0
+
+    def setSearchStats(self, stats):
+        """
+        Called by ClassicGameRules.newGame with the SearchStats to report
+        each move's search to.
+        """
+        self.stats = stats
+
+    def getMoveBudget(self, gameState):
+        """
+        Returns the number of seconds an anytime search may use for one move:
+        the moveTime argument, capped by a safe fraction of the game's move
+        time limit and by a share of the safe fraction of the game's total
+        time that is left.  Returns None if none of them is known.
+        """
+        limits = []
+        if self.moveTime > 0:
+            limits.append(self.moveTime)
+        if self.moveTimeLimit is not None:
+            limits.append(self.moveTimeLimit * ANYTIME_SAFETY)
+        if self.totalTimeLimit is not None:
+            timeLeft = max(0.0, self.totalTimeLimit * ANYTIME_SAFETY - self.timeUsed)
+            movesLeft = max(ANYTIME_MIN_MOVES, ANYTIME_MOVES_PER_FOOD * gameState.getNumFood())
+            limits.append(timeLeft / movesLeft)
+        if not limits:
+            return None
+        return min(limits)
+
+    def chooseAction(self, gameState):
+        """
+        Runs search() for the current move, either once at self.depth or, in
+        anytime mode, by iterative deepening within the move's time budget.
+        """
+        start = time.time()
+        self.startSearch()
+        if self.searchesInParallel():
+            # Start the pool before the move's statistics are collected
+            self.getSearchPool()
+        if self.stats is not None:
+            self.stats.startMove()
+        budget = self.getMoveBudget(gameState)
+        try:
+            if not self.anytime or budget is None:
+                self.completedDepth = self.depth
+                return self.rootSearch(gameState, self.depth)[1]
+            return self.iterativeDeepening(gameState, start + budget)
+        finally:
+            if self.stats is not None:
+                self.stats.endMove(self.completedDepth)
+            self.timeUsed += time.time() - start
+
+    def countCutoff(self):
+        """
+        Called by the pruning searches whenever they cut a node off.
+        """
+        if self.stats is not None:
+            self.stats.count('cutoffs')
+
+    def getLegalActions(self, gameState, agentIndex):
+        """
+        The searches expand states with this, and generate and evaluate them
+        with the two methods below, so that an attached SearchStats can count
+        and time the calls.
+        """
+        if self.stats is None:
+            return gameState.getLegalActions(agentIndex)
+        return self.stats.getLegalActions(gameState, agentIndex)
+
+    def generateSuccessor(self, gameState, agentIndex, action):
+        if self.stats is None:
+            return gameState.generateSuccessor(agentIndex, action)
+        return self.stats.generateSuccessor(gameState, agentIndex, action)
+
+    def evaluate(self, gameState):
+        if self.stats is None:
+            return self.evaluationFunction(gameState)
+        return self.stats.evaluate(self.evaluationFunction, gameState)
+
+    def rootSearch(self, gameState, maxDepth):
+        """
+        Runs search(), or parallelSearch() if the agent has several workers.
+        """
+        if self.searchesInParallel():
+            return self.parallelSearch(gameState, maxDepth)
+        return self.search(gameState, maxDepth)
+
+    def iterativeDeepening(self, gameState, deadline):
+        """
+        Searches to depth 1, 2, 3, ... until the deadline passes, and returns
+        the best action of the deepest search that finished.  Deepening also
+        stops once a search no longer reaches the depth limit anywhere, since
+        searching deeper could not change the result.
+        """
+        bestAction = None
+        depth = 1
+        self.completedDepth = 0
+        self.deadline = deadline
+        try:
+            while self.maxDepth <= 0 or depth <= self.maxDepth:
+                self.depthLimitReached = False
+                try:
+                    score, action = self.rootSearch(gameState, depth)
+                except SearchTimeout:
+                    break
+                bestAction = action
+                self.completedDepth = depth
+                if not self.depthLimitReached:
+                    break
+                depth += 1
+        finally:
+            self.deadline = None
+        if bestAction is None:
+            # Not even a one ply search finished in time
+            bestAction = gameState.getLegalActions(0)[0]
+        return bestAction
+
+    def search(self, gameState, maxDepth, rootActions=None, alpha=float('-inf')):
+        """
+        Searches maxDepth plies below gameState and returns (score, action).
+
+        Only rootActions (by default all of Pacman's legal actions) are tried
+        at the root.  Agents that prune may search them knowing that Pacman
+        can already get alpha; scores at or below alpha are then only bounds.
+        """
+        util.raiseNotDefined()
+
+    def evaluateBatch(self, gameStates):
+        """
+        Returns the evaluations of a list of states, computed in one call if
+        the evaluation function declares a batch version of itself.
+        """
+        batch = getattr(self.evaluationFunction, 'batch', None)
+        if batch is None:
+            return [self.evaluate(gameState) for gameState in gameStates]
+        if self.stats is None:
+            return batch(gameStates)
+        return self.stats.evaluate(batch, gameStates, batch=True)
+
+    def evaluateLastRound(self, gameState, chance=False):
+        """
+        Returns the value of a Pacman node one round above the depth limit.
+
+        The round's moves are expanded in full, all the leaves are evaluated
+        with a single evaluateBatch call, and the values are then backed up
+        as max over Pacman and min over the ghosts (or, with chance, their
+        average, summed in the same order as the scalar searches).  The value
+        is exact, so it is the same one the plain searches compute.
+        """
+        numAgents = gameState.getNumAgents()
+        leaves = []
+        def expand(gameState, agentIndex):
+            if agentIndex == numAgents or gameState.isWin() or gameState.isLose():
+                if agentIndex == numAgents:
+                    self.depthLimitReached = True
+                leaves.append(gameState)
+                return len(leaves) - 1
+            return (agentIndex, [expand(self.generateSuccessor(gameState, agentIndex, action), agentIndex + 1)
+                                 for action in self.getLegalActions(gameState, agentIndex)])
+        tree = expand(gameState, 0)
+        values = self.evaluateBatch(leaves)
+        def backUp(node):
+            if isinstance(node, int):
+                return values[node]
+            agentIndex, children = node
+            childValues = [backUp(child) for child in children]
+            if agentIndex == 0:
+                return max(childValues)
+            if chance:
+                return sum(childValues) / len(childValues)
+            return min(childValues)
+        return backUp(tree)
+
+    def youngBrothersWait(self):
+        """
+        Whether parallelSearch should search the first root action on its own
+        so the rest can be searched with its score as alpha.
+        """
+        return False
+
+    def orderRootActions(self, gameState, actions):
+        """
+        Returns the root actions in the order parallelSearch should try them.
+        """
+        return actions
+
+    def parallelSearch(self, gameState, maxDepth):
+        """
+        Searches the root actions in a pool of self.workers processes and
+        returns the same (score, action) as search().
+
+        Each pool process keeps its own copy of the agent, so a task is just
+        the root state (whose layout is pickled as its text), an action and
+        the window.  Ties go to the action listed first by getLegalActions,
+        as in the serial searches.
+        """
+        legalActions = gameState.getLegalActions(0)
+        actions = self.orderRootActions(gameState, legalActions)
+        alpha = float('-inf')
+        results = []
+        if self.youngBrothersWait():
+            score, _ = self.search(gameState, maxDepth, actions[:1])
+            results.append((score, actions[0]))
+            alpha = score
+            actions = actions[1:]
+        tasks = [(gameState, action, maxDepth, alpha, self.deadline) for action in actions]
+        for action, (score, limitReached, timedOut) in zip(actions, self.getSearchPool().map(searchRootAction, tasks)):
+            if timedOut:
+                raise SearchTimeout()
+            if limitReached:
+                self.depthLimitReached = True
+            results.append((score, action))
+        return max(results, key=lambda result: (result[0], -legalActions.index(result[1])))
+
+    def searchesInParallel(self):
+        """
+        Whether the root actions are searched by the pool of workers.  Pool
+        processes may not start pools of their own, so an agent playing in
+        one (as in runSeededGames) searches serially whatever its workers.
+        """
+        return self.workers > 1 and not multiprocessing.current_process().daemon
+
+    def getSearchPool(self):
+        """
+        Starts the worker pool the first time it is needed.
+        """
+        if self.pool is None:
+            worker = copy.copy(self)
+            worker.workers = 0
+            worker.stats = None
+            if self.transpositionTable is not None:
+                worker.transpositionTable = TranspositionTable(self.transpositionTable.size)
+            self.pool = multiprocessing.Pool(self.workers, initSearchWorker, (worker,))
+        return self.pool
+
+    def final(self, state):
+        """
+        Called by the game when it is over; shuts the worker pool down.
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def probe(self, gameState, agentIndex, remaining, alpha=float('-inf'), beta=float('inf')):
+        """
+        Looks up gameState in the transposition table, if there is one.
+
+        Returns a (value, bestMove) pair; value is None unless a stored result
+        for the same remaining depth can stand in for searching the state.
+        """
+        if self.transpositionTable is None:
+            return None, None
+        value, bestMove = self.transpositionTable.lookup(gameState, agentIndex, remaining, alpha, beta)
+        if value is not None:
+            if self.stats is not None:
+                self.stats.count('ttHits')
+            # The stored search may have stopped at the depth limit; assume it
+            # did, so that iterative deepening does not stop too early
+            self.depthLimitReached = True
+        return value, bestMove
+
+    def record(self, gameState, agentIndex, remaining, value, bestMove=None, alpha=float('-inf'), beta=float('inf')):
+        """
+        Stores the result of searching gameState, classifying it as exact or
+        as a bound depending on where it fell relative to the (alpha, beta)
+        window it was searched with.
+        """
+        if self.transpositionTable is None:
+            return
+        if value < alpha:
+            flag = UPPER_BOUND
+        elif value > beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.transpositionTable.store(gameState, agentIndex, remaining, value, flag, bestMove)
+
+    def startSearch(self):
+        """
+        Called at the start of every getAction.
+        """
+        if self.transpositionTable is None:
+            return
+        if self.reuseTable:
+            self.transpositionTable.newGeneration()
+        else:
+            self.transpositionTable.clear()
 
 class MinimaxAgent(MultiAgentSearchAgent):
     """
@@ -159,39 +691,65 @@ class MinimaxAgent(MultiAgentSearchAgent):
         Returns whether or not the game state is a losing state
         """
         "*** YOUR CODE HERE ***"
+        return self.chooseAction(gameState)
+
+    def search(self, gameState, maxDepth, rootActions=None, alpha=float('-inf')):
         def getValue(gameState, depth, agentIndex):
-            if depth >= self.depth or gameState.isWin() or gameState.isLose():
-                return self.evaluationFunction(gameState), None
+            if self.deadline is not None and time.time() > self.deadline:
+                raise SearchTimeout()
+            if depth >= maxDepth or gameState.isWin() or gameState.isLose():
+                if depth >= maxDepth:
+                    self.depthLimitReached = True
+                return self.evaluate(gameState), None
+            elif agentIndex == 0 and self.batchEvaluation and depth == maxDepth - 1:
+                return self.evaluateLastRound(gameState), None
             elif agentIndex == 0:
                 return maximize(gameState, depth, 0)
             else:
                 return minimize(gameState, depth, agentIndex)
 
         def maximize(gameState, depth, agentIndex):
+            cached, cachedAction = self.probe(gameState, agentIndex, maxDepth - depth)
+            if cached is not None:
+                return cached, cachedAction
             bestAction = None
             bestScore = float('-inf')
-            for action in gameState.getLegalActions(agentIndex):
-                successor = gameState.generateSuccessor(agentIndex, action)
+            for action in self.getLegalActions(gameState, agentIndex):
+                successor = self.generateSuccessor(gameState, agentIndex, action)
                 score, _ = getValue(successor, depth, agentIndex+1)
                 if score > bestScore:
                     bestScore = score
                     bestAction = action
+            self.record(gameState, agentIndex, maxDepth - depth, bestScore, bestAction)
             return bestScore, bestAction
 
         def minimize(gameState, depth, agentIndex):
+            cached, cachedAction = self.probe(gameState, agentIndex, maxDepth - depth)
+            if cached is not None:
+                return cached, cachedAction
             bestScore = float('inf')
-            for action in gameState.getLegalActions(agentIndex):
-                successor = gameState.generateSuccessor(agentIndex, action)
+            for action in self.getLegalActions(gameState, agentIndex):
+                successor = self.generateSuccessor(gameState, agentIndex, action)
                 if agentIndex == gameState.getNumAgents()-1:
                     score, _ = getValue(successor, depth+1, 0)
                 else:
                     score, _ = getValue(successor, depth, agentIndex+1)
                 if score < bestScore:
                     bestScore = score
+            self.record(gameState, agentIndex, maxDepth - depth, bestScore)
             return bestScore, _
 
-        bestScore, bestAction = maximize(gameState, 0, 0)
-        return bestAction
+        if rootActions is None:
+            return maximize(gameState, 0, 0)
+        bestScore = float('-inf')
+        bestAction = None
+        for action in rootActions:
+            successor = self.generateSuccessor(gameState, 0, action)
+            score, _ = getValue(successor, 0, 1)
+            if score > bestScore:
+                bestScore = score
+                bestAction = action
+        return bestScore, bestAction
         
 
 class AlphaBetaAgent(MultiAgentSearchAgent):
@@ -199,67 +757,202 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
     Your minimax agent with alpha-beta pruning (question 3)
     """
 
+    def __init__(self, ordering = 'False', **args):
+        MultiAgentSearchAgent.__init__(self, **args)
+        # With ordering on, each node tries the transposition table's (or the
+        # previous iteration's) best move first, then the killer moves for
+        # its ply, then the rest by history score.  The value and the chosen
+        # action are the same as without ordering; only the work differs.
+        self.ordering = parseFlag(ordering)
+        self.killers = {}
+        self.history = util.Counter()
+        self.rootBestAction = None
+        self.nodesSearched = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+
     def getAction(self, gameState: GameState):
         """
         Returns the minimax action using self.depth and self.evaluationFunction
         """
         "*** YOUR CODE HERE ***"
+        return self.chooseAction(gameState)
+
+    def startSearch(self):
+        MultiAgentSearchAgent.startSearch(self)
+        self.killers = {}
+        self.rootBestAction = None
+        # Age the history so that it favours what worked in recent positions
+        for key in list(self.history.keys()):
+            self.history[key] //= 2
+
+    def orderActions(self, gameState, agentIndex, ply, actions, bestMove):
+        """
+        Returns actions sorted so the ones most likely to cause a cutoff come
+        first: bestMove, the killer moves of this ply, then by history.
+        """
+        killers = self.killers.get(ply, [])
+        if agentIndex == 0:
+            position = gameState.getPacmanPosition()
+        else:
+            position = gameState.getGhostPosition(agentIndex)
+        def priority(action):
+            if action == bestMove:
+                return (0, 0)
+            if action in killers:
+                return (1, killers.index(action))
+            return (2, -self.history[(agentIndex, position, action)])
+        return sorted(actions, key=priority)
+
+    def recordCutoff(self, gameState, agentIndex, ply, action, remaining, moveNumber):
+        """
+        Updates the cutoff statistics, and the killer and history tables when
+        ordering is on, after action caused a cutoff.
+        """
+        self.cutoffs += 1
+        self.countCutoff()
+        if moveNumber == 0:
+            self.firstMoveCutoffs += 1
+        if not self.ordering:
+            return
+        killers = self.killers.setdefault(ply, [])
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[2:]
+        if agentIndex == 0:
+            position = gameState.getPacmanPosition()
+        else:
+            position = gameState.getGhostPosition(agentIndex)
+        self.history[(agentIndex, position, action)] += remaining * remaining
+
+    def getCutoffStats(self):
+        """
+        Returns the number of interior nodes searched and how often, and how
+        early, they were cut off.
+        """
+        return {'nodes': self.nodesSearched, 'cutoffs': self.cutoffs,
+                'cutoffRate': self.cutoffs / self.nodesSearched if self.nodesSearched else 0.0,
+                'firstMoveCutoffRate': self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0}
+
+    def youngBrothersWait(self):
+        return True
+
+    def orderRootActions(self, gameState, actions):
+        if self.ordering:
+            return self.orderActions(gameState, 0, (0, 0), actions, self.rootBestAction)
+        return actions
+
+    def parallelSearch(self, gameState, maxDepth):
+        bestScore, bestAction = MultiAgentSearchAgent.parallelSearch(self, gameState, maxDepth)
+        self.rootBestAction = bestAction
+        return bestScore, bestAction
+
+    def search(self, gameState, maxDepth, rootActions=None, alpha=float('-inf')):
         def getValue(gameState, depth, agentIndex, alpha, beta):
-            if depth >= self.depth or gameState.isWin() or gameState.isLose():
-                return self.evaluationFunction(gameState)
+            if self.deadline is not None and time.time() > self.deadline:
+                raise SearchTimeout()
+            if depth >= maxDepth or gameState.isWin() or gameState.isLose():
+                if depth >= maxDepth:
+                    self.depthLimitReached = True
+                return self.evaluate(gameState)
+            elif agentIndex == 0 and self.batchEvaluation and depth == maxDepth - 1:
+                # Exact, so a valid result for any window
+                return self.evaluateLastRound(gameState)
             elif agentIndex == 0:
                 return maximize(gameState, depth, alpha, beta)
             else:
                 return minimize(gameState, depth, agentIndex, alpha, beta)
             
         def maximize(gameState, depth, alpha, beta):
+            cached, bestMove = self.probe(gameState, 0, maxDepth - depth, alpha, beta)
+            if cached is not None:
+                return cached
+            self.nodesSearched += 1
+            window = (alpha, beta)
             bestScore = float('-inf')
-            for action in gameState.getLegalActions(0):
-                successor = gameState.generateSuccessor(0, action)
+            bestAction = None
+            actions = self.getLegalActions(gameState, 0)
+            if self.ordering:
+                actions = self.orderActions(gameState, 0, (depth, 0), actions, bestMove)
+            for moveNumber, action in enumerate(actions):
+                successor = self.generateSuccessor(gameState, 0, action)
                 score = getValue(successor, depth, 1, alpha, beta)
                 if score > bestScore:
                     bestScore = score
+                    bestAction = action
                 if bestScore > beta:
-                    return bestScore
+                    self.recordCutoff(gameState, 0, (depth, 0), action, maxDepth - depth, moveNumber)
+                    break
                 if bestScore > alpha:
                     alpha = bestScore
+            self.record(gameState, 0, maxDepth - depth, bestScore, bestAction, *window)
             return bestScore
 
         def minimize(gameState, depth, agentIndex, alpha, beta):
+            cached, bestMove = self.probe(gameState, agentIndex, maxDepth - depth, alpha, beta)
+            if cached is not None:
+                return cached
+            self.nodesSearched += 1
+            window = (alpha, beta)
             bestScore = float('inf')
-            for action in gameState.getLegalActions(agentIndex):
-                successor = gameState.generateSuccessor(agentIndex, action)
+            bestAction = None
+            actions = self.getLegalActions(gameState, agentIndex)
+            if self.ordering:
+                actions = self.orderActions(gameState, agentIndex, (depth, agentIndex), actions, bestMove)
+            for moveNumber, action in enumerate(actions):
+                successor = self.generateSuccessor(gameState, agentIndex, action)
                 if agentIndex == gameState.getNumAgents()-1:
                     score = getValue(successor, depth+1, 0, alpha, beta)
                 else:
                     score = getValue(successor, depth, agentIndex+1, alpha, beta)
                 if score < bestScore:
                     bestScore = score
+                    bestAction = action
                 if bestScore < alpha:
-                    return bestScore
+                    self.recordCutoff(gameState, agentIndex, (depth, agentIndex), action, maxDepth - depth, moveNumber)
+                    break
                 if bestScore < beta:
                     beta = bestScore
+            self.record(gameState, agentIndex, maxDepth - depth, bestScore, bestAction, *window)
             return bestScore
         
         bestScore = float('-inf')
         bestAction = None
-        alpha = float('-inf')
         beta = float('inf')
-        for action in gameState.getLegalActions(0):
-            successor = gameState.generateSuccessor(0, action)
+        legalActions = self.getLegalActions(gameState, 0)
+        if rootActions is not None:
+            actions = rootActions
+        else:
+            actions = self.orderRootActions(gameState, legalActions)
+        for action in actions:
+            successor = self.generateSuccessor(gameState, 0, action)
             score = getValue(successor, 0, 1, alpha, beta)
-            if score > bestScore:
+            # Ties go to the action listed first by getLegalActions, whatever
+            # order the actions were searched in
+            if score > bestScore or (score == bestScore and bestAction is not None
+                                     and legalActions.index(action) < legalActions.index(bestAction)):
                 bestScore = score
                 bestAction = action
             if bestScore > alpha:
                 alpha = bestScore
-        return bestAction
+        self.rootBestAction = bestAction
+        return bestScore, bestAction
 
 class ExpectimaxAgent(MultiAgentSearchAgent):
     """
       Your expectimax agent (question 4)
     """
 
+    def __init__(self, pruning = 'none', **args):
+        MultiAgentSearchAgent.__init__(self, **args)
+        # 'star1' prunes chance nodes using the bounds declared by the
+        # evaluation function; see starSearch
+        self.pruning = pruning.lower()
+        if self.pruning not in ['none', 'star1']:
+            raise Exception('Unknown expectimax pruning: ' + pruning)
+        if self.pruning != 'none' and not hasattr(self.evaluationFunction, 'bounds'):
+            raise Exception('Star1 pruning needs an evaluation function that declares bounds')
+
     def getAction(self, gameState: GameState):
         """
         Returns the expectimax action using self.depth and self.evaluationFunction
@@ -268,44 +961,329 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         legal moves.
         """
         "*** YOUR CODE HERE ***"
+        return self.chooseAction(gameState)
+
+    def youngBrothersWait(self):
+        # Only the pruning searches can make use of alpha
+        return self.pruning != 'none'
+
+    def search(self, gameState, maxDepth, rootActions=None, alpha=float('-inf')):
+        if self.pruning != 'none':
+            return self.starSearch(gameState, maxDepth, rootActions, alpha)
+        if rootActions is None:
+            rootActions = self.getLegalActions(gameState, 0)
+
         def getValue(gameState, depth, agentIndex):
-            if depth >= self.depth or gameState.isWin() or gameState.isLose():
-                return self.evaluationFunction(gameState)
+            if self.deadline is not None and time.time() > self.deadline:
+                raise SearchTimeout()
+            if depth >= maxDepth or gameState.isWin() or gameState.isLose():
+                if depth >= maxDepth:
+                    self.depthLimitReached = True
+                return self.evaluate(gameState)
+            elif agentIndex == 0 and self.batchEvaluation and depth == maxDepth - 1:
+                return self.evaluateLastRound(gameState, chance=True)
             elif agentIndex == 0:
                 return maximize(gameState, depth)
             else:
                 return minimize(gameState, depth, agentIndex)
             
         def maximize(gameState, depth):
+            cached, _ = self.probe(gameState, 0, maxDepth - depth)
+            if cached is not None:
+                return cached
             bestScore = float('-inf')
-            for action in gameState.getLegalActions(0):
-                successor = gameState.generateSuccessor(0, action)
+            bestAction = None
+            for action in self.getLegalActions(gameState, 0):
+                successor = self.generateSuccessor(gameState, 0, action)
                 score = getValue(successor, depth, 1)
                 if score > bestScore:
                     bestScore = score
+                    bestAction = action
+            self.record(gameState, 0, maxDepth - depth, bestScore, bestAction)
             return bestScore
 
         def minimize(gameState, depth, agentIndex):
+            cached, _ = self.probe(gameState, agentIndex, maxDepth - depth)
+            if cached is not None:
+                return cached
             scoreSum = 0
-            legalActions = gameState.getLegalActions(agentIndex)
+            legalActions = self.getLegalActions(gameState, agentIndex)
             for action in legalActions:
-                successor = gameState.generateSuccessor(agentIndex, action)
+                successor = self.generateSuccessor(gameState, agentIndex, action)
                 if agentIndex == gameState.getNumAgents()-1:
                     score = getValue(successor, depth+1, 0)
                 else:
                     score = getValue(successor, depth, agentIndex+1)
                 scoreSum += score
+            self.record(gameState, agentIndex, maxDepth - depth, scoreSum/len(legalActions))
             return scoreSum/len(legalActions)
         
         bestScore = float('-inf')
         bestAction = None
-        for action in gameState.getLegalActions(0):
-            successor = gameState.generateSuccessor(0, action)
+        for action in rootActions:
+            successor = self.generateSuccessor(gameState, 0, action)
             score = getValue(successor, 0, 1)
             if score > bestScore:
                 bestScore = score
                 bestAction = action
-        return bestAction
+        return bestScore, bestAction
+
+    def starSearch(self, gameState, maxDepth, rootActions=None, alpha=float('-inf')):
+        """
+        Expectimax with Ballard's Star1 pruning.
+
+        Knowing the bounds the evaluation function declares below a chance
+        node, it can stop as soon as the children searched so far force its
+        average below alpha or above beta, and it searches each child with the
+        narrowest window that could still matter.
+
+        Values returned below alpha are upper bounds and values above beta are
+        lower bounds; values in between are exact, so with finite evaluations
+        the chosen action is the same as without pruning.  Infinite leaf
+        values (betterEvaluationFunction's wins and losses) are clamped to
+        the leaf's own declared bounds.
+        """
+        bounds = self.evaluationFunction.bounds
+
+        def getValue(gameState, depth, agentIndex, alpha, beta):
+            if self.deadline is not None and time.time() > self.deadline:
+                raise SearchTimeout()
+            if depth >= maxDepth or gameState.isWin() or gameState.isLose():
+                if depth >= maxDepth:
+                    self.depthLimitReached = True
+                value = self.evaluate(gameState)
+                if value == float('inf') or value == float('-inf'):
+                    lower, upper = bounds(gameState, 0)
+                    value = min(max(value, lower), upper)
+                return value
+            elif agentIndex == 0:
+                return maximize(gameState, depth, alpha, beta)
+            else:
+                return expect(gameState, depth, agentIndex, alpha, beta)
+
+        def maximize(gameState, depth, alpha, beta):
+            cached, _ = self.probe(gameState, 0, maxDepth - depth, alpha, beta)
+            if cached is not None:
+                return cached
+            window = (alpha, beta)
+            bestScore = float('-inf')
+            bestAction = None
+            for action in self.getLegalActions(gameState, 0):
+                successor = self.generateSuccessor(gameState, 0, action)
+                score = getValue(successor, depth, 1, alpha, beta)
+                if score > bestScore:
+                    bestScore = score
+                    bestAction = action
+                if bestScore > beta:
+                    self.countCutoff()
+                    break
+                if bestScore > alpha:
+                    alpha = bestScore
+            self.record(gameState, 0, maxDepth - depth, bestScore, bestAction, *window)
+            return bestScore
+
+        def expect(gameState, depth, agentIndex, alpha, beta):
+            cached, _ = self.probe(gameState, agentIndex, maxDepth - depth, alpha, beta)
+            if cached is not None:
+                return cached
+            window = (alpha, beta)
+            lower, upper = bounds(gameState, maxDepth - depth)
+            legalActions = self.getLegalActions(gameState, agentIndex)
+            n = len(legalActions)
+            if agentIndex == gameState.getNumAgents()-1:
+                nextDepth, nextAgent = depth+1, 0
+            else:
+                nextDepth, nextAgent = depth, agentIndex+1
+            scoreSum = 0
+            for i in range(n):
+                # The children not searched yet are only known to lie within
+                # the bounds
+                lowerRest = (n - i - 1) * lower
+                upperRest = (n - i - 1) * upper
+                childAlpha = max(n * alpha - scoreSum - upperRest, lower)
+                childBeta = min(n * beta - scoreSum - lowerRest, upper)
+                successor = self.generateSuccessor(gameState, agentIndex, legalActions[i])
+                score = getValue(successor, nextDepth, nextAgent, childAlpha, childBeta)
+                if score < childAlpha:
+                    self.countCutoff()
+                    value = (scoreSum + score + upperRest) / n
+                    self.record(gameState, agentIndex, maxDepth - depth, value, None, *window)
+                    return value
+                if score > childBeta:
+                    self.countCutoff()
+                    value = (scoreSum + score + lowerRest) / n
+                    self.record(gameState, agentIndex, maxDepth - depth, value, None, *window)
+                    return value
+                scoreSum += score
+            self.record(gameState, agentIndex, maxDepth - depth, scoreSum/n, None, *window)
+            return scoreSum/n
+
+        if rootActions is None:
+            rootActions = self.getLegalActions(gameState, 0)
+        bestScore = float('-inf')
+        bestAction = None
+        for action in rootActions:
+            successor = self.generateSuccessor(gameState, 0, action)
+            score = getValue(successor, 0, 1, max(alpha, bestScore), float('inf'))
+            if score > bestScore:
+                bestScore = score
+                bestAction = action
+        return bestScore, bestAction
+
+class MonteCarloNode:
+    """
+    A Pacman decision in a Monte Carlo search tree.  Pacman's own moves are
+    deterministic, so the actions reaching a node fix his position and legal
+    actions there, while the ghosts are sampled afresh on every visit.
+    """
+    __slots__ = ('children', 'untried', 'visits', 'totalValue')
+
+    def __init__(self):
+        self.children = {}
+        self.untried = None
+        self.visits = 0
+        self.totalValue = 0.0
+
+class MonteCarloAgent(MultiAgentSearchAgent):
+    """
+    A Monte Carlo tree search (UCT) agent.
+
+    Each playout descends the tree by the UCT rule, adds one new node and
+    then plays batchSize random rollouts of up to rolloutDepth rounds from
+    it, scoring each with the evaluation function.  Ghosts move according
+    to a model from ghostAgents, both in the tree and in the rollouts.  The
+    search stops after playouts playouts or when the move's time budget
+    (moveTime, capped by the game's move time limit) runs out, and picks
+    the most visited action.  The depth argument is not used.
+    """
+
+    def __init__(self, playouts = '400', rolloutDepth = '2', batchSize = '4',
+                 exploration = '1.0', ghost = 'RandomGhost',
+                 evalFn = 'betterEvaluationFunction', **args):
+        MultiAgentSearchAgent.__init__(self, evalFn=evalFn, **args)
+        self.playouts = int(playouts)
+        self.rolloutDepth = int(rolloutDepth)
+        self.batchSize = int(batchSize)
+        self.exploration = float(exploration)
+        self.ghostType = util.lookup(ghost, vars(ghostAgents))
+        self.ghostModels = {}
+        self.playoutsRun = 0
+
+    def getAction(self, gameState: GameState):
+        """
+        Returns the most visited root action after the move's playouts.
+        """
+        start = time.time()
+        budget = self.getMoveBudget(gameState)
+        deadline = None
+        if budget is not None:
+            deadline = start + budget
+        root = MonteCarloNode()
+        # Rollout values seen this move, used to scale them into [0, 1]
+        self.valueRange = [float('inf'), float('-inf')]
+        self.playoutsRun = 0
+        if self.stats is not None:
+            self.stats.startMove()
+        try:
+            while self.playoutsRun < self.playouts:
+                if deadline is not None and time.time() > deadline:
+                    break
+                self.playout(root, gameState)
+        finally:
+            if self.stats is not None:
+                # There is no fixed search depth to report
+                self.stats.endMove(0)
+            self.timeUsed += time.time() - start
+        legalActions = gameState.getLegalActions(0)
+        return max(legalActions, key=lambda action: (
+            root.children[action].visits if action in root.children else -1,
+            -legalActions.index(action)))
+
+    def playout(self, root, gameState):
+        """
+        Walks down the tree from root, expands one node and backs up the
+        values of a batch of rollouts from it.
+        """
+        node = root
+        path = [root]
+        state = gameState
+        while not (state.isWin() or state.isLose()):
+            if node.untried is None:
+                node.untried = list(self.getLegalActions(state, 0))
+            if node.untried:
+                action = node.untried.pop(random.randrange(len(node.untried)))
+                node.children[action] = MonteCarloNode()
+                path.append(node.children[action])
+                state = self.simulateRound(state, action)
+                break
+            action = self.selectAction(node)
+            node = node.children[action]
+            path.append(node)
+            state = self.simulateRound(state, action)
+
+        total = 0.0
+        for _ in range(self.batchSize):
+            value = self.rollout(state)
+            self.valueRange[0] = min(self.valueRange[0], value)
+            self.valueRange[1] = max(self.valueRange[1], value)
+            total += value
+        for node in path:
+            node.visits += self.batchSize
+            node.totalValue += total
+        self.playoutsRun += 1
+
+    def selectAction(self, node):
+        """
+        The child action with the highest upper confidence bound.
+        """
+        low, high = self.valueRange
+        span = high - low if high > low else 1.0
+        logVisits = math.log(node.visits)
+        def ucb(action):
+            child = node.children[action]
+            mean = (child.totalValue / child.visits - low) / span
+            return mean + self.exploration * math.sqrt(logVisits / child.visits)
+        return max(node.children, key=ucb)
+
+    def simulateRound(self, gameState, action):
+        """
+        Pacman takes action, then each ghost moves as its model chooses.
+        """
+        gameState = self.generateSuccessor(gameState, 0, action)
+        for agentIndex in range(1, gameState.getNumAgents()):
+            if gameState.isWin() or gameState.isLose():
+                break
+            gameState = self.generateSuccessor(
+                gameState, agentIndex, self.getGhostModel(agentIndex).getAction(gameState))
+        return gameState
+
+    def rollout(self, gameState):
+        """
+        Plays rolloutDepth rounds in which Pacman moves at random (never
+        stopping unless he must) and returns the evaluation of the result.
+        """
+        for _ in range(self.rolloutDepth):
+            if gameState.isWin() or gameState.isLose():
+                break
+            actions = self.getLegalActions(gameState, 0)
+            if len(actions) > 1 and Directions.STOP in actions:
+                actions.remove(Directions.STOP)
+            gameState = self.simulateRound(gameState, random.choice(actions))
+        value = self.evaluate(gameState)
+        if value == float('inf') or value == float('-inf'):
+            # Averages need finite values; see the bounds on the evaluation
+            # functions
+            if hasattr(self.evaluationFunction, 'bounds'):
+                lower, upper = self.evaluationFunction.bounds(gameState, 0)
+                value = min(max(value, lower), upper)
+            else:
+                value = gameState.getScore()
+        return value
+
+    def getGhostModel(self, agentIndex):
+        if agentIndex not in self.ghostModels:
+            self.ghostModels[agentIndex] = self.ghostType(agentIndex)
+        return self.ghostModels[agentIndex]
 
 def betterEvaluationFunction(currentGameState: GameState):
     """
@@ -316,7 +1294,7 @@ def betterEvaluationFunction(currentGameState: GameState):
     """
     "*** YOUR CODE HERE ***"
     pacmanPosition = currentGameState.getPacmanPosition()
-    foodList = currentGameState.getFood().asList()
+    foodList = currentGameState.getFoodList()
     ghostPositions = [currentGameState.getGhostPosition(ghostIndex) for ghostIndex in range(1, currentGameState.getNumAgents())]
     score = currentGameState.getScore()
 
@@ -335,5 +1313,67 @@ def betterEvaluationFunction(currentGameState: GameState):
     return score
 
 
+def betterEvaluationBounds(currentGameState: GameState, depth):
+    """
+    Bounds on betterEvaluationFunction for every state within depth rounds of
+    currentGameState: six times the score bounds, less at most the board's
+    span for each distance and two per remaining pellet.  With depth 0 this
+    clamps a win to the best value its score allows and a loss to the worst.
+    """
+    scoreLower, scoreUpper = scoreEvaluationBounds(currentGameState, depth)
+    walls = currentGameState.getWalls()
+    span = walls.width + walls.height
+    return (6 * scoreLower - 6 * span - 2 * currentGameState.getNumFood(), 6 * scoreUpper)
+
+def betterEvaluationBatch(gameStates):
+    """
+    betterEvaluationFunction for a list of states, returning the same values
+    as a list.  The distances to food and ghosts of all the states are
+    computed together with NumPy when it is installed.
+    """
+    if numpy is None:
+        return [betterEvaluationFunction(gameState) for gameState in gameStates]
+    scores = []
+    pellets = []
+    pacmanPositions = []
+    ghostPositions = []
+    wins = []
+    loses = []
+    # Leaves of one search mostly share a few food lists, so the distances
+    # to food are computed for each list and the states that have it
+    foodGroups = {}
+    for i, gameState in enumerate(gameStates):
+        scores.append(gameState.getScore())
+        pacmanPositions.append(gameState.getPacmanPosition())
+        ghostPositions.append(gameState.getGhostPositions())
+        wins.append(gameState.isWin())
+        loses.append(gameState.isLose())
+        foodList = gameState.getFoodList()
+        pellets.append(len(foodList))
+        if id(foodList) not in foodGroups:
+            foodGroups[id(foodList)] = (foodList, [])
+        foodGroups[id(foodList)][1].append(i)
+    scores = numpy.array(scores)
+    pellets = numpy.array(pellets)
+    pacmanPositions = numpy.array(pacmanPositions, dtype=float)
+    ghostPositions = numpy.array(ghostPositions, dtype=float)
+
+    closestFood = numpy.zeros(len(gameStates))
+    for foodList, indices in foodGroups.values():
+        if not foodList:
+            # Only won states have no food left
+            continue
+        food = numpy.array(foodList, dtype=float)
+        closestFood[indices] = numpy.abs(food[None, :, :] - pacmanPositions[indices][:, None, :]).sum(axis=2).min(axis=1)
+    closestGhost = numpy.abs(ghostPositions - pacmanPositions[:, None, :]).sum(axis=2).min(axis=1)
+
+    values = scores - closestFood - 2 * pellets - 5 * closestGhost + 5 * scores
+    values = numpy.where(loses, float('-inf'), values)
+    values = numpy.where(wins, float('inf'), values)
+    return values.tolist()
+
+betterEvaluationFunction.bounds = betterEvaluationBounds
+betterEvaluationFunction.batch = betterEvaluationBatch
+
 # Abbreviation
 better = betterEvaluationFunction
\ No newline at end of file
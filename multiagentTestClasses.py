@@ -29,6 +29,7 @@ pp = PrettyPrinter()
 
 from game import Agent
 from pacman import GameState
+from pacman import ExploredStates
 from ghostAgents import RandomGhost, DirectionalGhost
 import random
 import math
@@ -345,8 +346,12 @@ class PacmanGameTreeTest(testClasses.TestCase):
                            altDepthActions, partialPlyBugActions)
         # check return codes and assign grades
         disp = self.question.getDisplay()
-        stats = run(lay, self.layout_name, pac, [DirectionalGhost(
-            i + 1) for i in range(2)], disp, name=self.alg)
+        GameState.setExploredTracker(ExploredStates())
+        try:
+            stats = run(lay, self.layout_name, pac, [DirectionalGhost(
+                i + 1) for i in range(2)], disp, name=self.alg)
+        finally:
+            GameState.setExploredTracker(None)
         if stats['timeouts'] > 0:
             self.addMessage('Agent timed out on smallClassic.  No credit')
             return self.testFail(grades)
@@ -395,8 +400,12 @@ class PacmanGameTreeTest(testClasses.TestCase):
             ourPacOptions = {}
         pac = PolyAgent(self.seed, multiAgents, ourPacOptions, self.depth)
         disp = self.question.getDisplay()
-        run(lay, self.layout_name, pac, [DirectionalGhost(
-            i + 1) for i in range(2)], disp, name=self.alg)
+        GameState.setExploredTracker(ExploredStates())
+        try:
+            run(lay, self.layout_name, pac, [DirectionalGhost(
+                i + 1) for i in range(2)], disp, name=self.alg)
+        finally:
+            GameState.setExploredTracker(None)
         (optimalActions, altDepthActions, partialPlyBugActions) = pac.getTraces()
         # recover traces and record to file
         handle = open(filePath, 'w')
@@ -576,3 +585,113 @@ class EvalAgentTest(testClasses.TestCase):
         handle.write('# File intentionally blank.\n')
         handle.close()
         return True
+
+
+class UndoMoveTest(testClasses.TestCase):
+    """
+    Checks that GameState.applyMove and undoMove walk the game tree exactly
+    as generateSuccessor does.
+
+    From states reached by random play on a layout, every line of play up
+    to a depth is made in place with applyMove and compared with the state
+    generateSuccessor gives for it: the states must be ==, hash the same,
+    and agree on the food list, the win and lose flags, the score and the
+    agents.  After each undoMove the state must be exactly what it was
+    before the move, and the states generateSuccessor returned must not
+    have changed.  The search runs both on a copy of each state and on a
+    read only view of it, which must leave the state it views untouched.
+    """
+
+    def __init__(self, question, testDict):
+        super(UndoMoveTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.numGhosts = int(testDict['numGhosts'])
+        self.seed = int(testDict['randomSeed'])
+        self.numStates = int(testDict['numStates'])
+        self.maxRandomMoves = int(testDict['maxRandomMoves'])
+        self.depth = int(testDict['depth'])
+
+    def getSignature(self, state):
+        """
+        Returns everything about state that a move can change.
+        """
+        data = state.data
+        agents = tuple([(agent.configuration.pos, agent.configuration.direction,
+                         agent.scaredTimer, agent.numCarrying, agent.numReturned)
+                        for agent in data.agentStates])
+        return (agents, state.getFood().asList(), state.getFoodList(), state.getNumFood(),
+                tuple(state.getCapsules()), state.getScore(), data.scoreChange,
+                state.isWin(), state.isLose(), hash(state), tuple(data._eaten),
+                data._agentMoved, data._foodEaten, data._foodAdded, data._capsuleEaten,
+                tuple(state.getLegalActions(0)))
+
+    def compare(self, state, expected, description):
+        if state != expected or hash(state) != hash(expected):
+            self.addMessage('%s: state differs from generateSuccessor' % description)
+            return False
+        if self.getSignature(state) != self.getSignature(expected):
+            self.addMessage('%s: food, flags or agents differ from generateSuccessor' % description)
+            return False
+        return True
+
+    def search(self, state, agentIndex, depth, line):
+        """
+        Walks the game tree below state with applyMove and undoMove, and
+        returns the number of moves checked, or None at the first mismatch.
+        """
+        if depth == 0 or state.isWin() or state.isLose():
+            return 0
+        before = self.getSignature(state)
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        checked = 0
+        for action in state.getLegalActions(agentIndex):
+            description = '%s after %s' % (self.layoutName, line + [(agentIndex, action)])
+            expected = state.generateSuccessor(agentIndex, action)
+            expectedSignature = self.getSignature(expected)
+            undo = state.applyMove(agentIndex, action)
+            if not self.compare(state, expected, description):
+                return None
+            below = self.search(state, nextAgent, depth - 1, line + [(agentIndex, action)])
+            if below is None:
+                return None
+            state.undoMove(undo)
+            if self.getSignature(state) != before:
+                self.addMessage('%s: undoMove did not restore the state' % description)
+                return None
+            if self.getSignature(expected) != expectedSignature:
+                self.addMessage('%s: applyMove changed a generated successor' % description)
+                return None
+            checked += below + 1
+        return checked
+
+    def execute(self, grades, moduleDict, solutionDict):
+        random.seed(self.seed)
+        lay = layout.getLayout(self.layoutName)
+        checked = 0
+        for n in range(self.numStates):
+            state = GameState()
+            state.initialize(lay, self.numGhosts)
+            for i in range(random.randint(0, self.maxRandomMoves)):
+                if state.isWin() or state.isLose():
+                    break
+                agentIndex = i % state.getNumAgents()
+                state = state.generateSuccessor(
+                    agentIndex, random.choice(state.getLegalActions(agentIndex)))
+            original = self.getSignature(state)
+            for start in [GameState(state), state.makeReadOnlyView()]:
+                result = self.search(start, 0, self.depth, [])
+                if result is None:
+                    return self.testFail(grades)
+                checked += result
+            if self.getSignature(state) != original:
+                self.addMessage('%s: searching a read only view changed the state' % self.layoutName)
+                return self.testFail(grades)
+        self.addMessage('%d moves checked' % checked)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
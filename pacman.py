@@ -43,6 +43,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import ZOBRIST
 from util import nearestPoint
 from util import manhattanDistance
 import util
@@ -72,32 +73,43 @@ class GameState:
 
     Note that in classic Pacman, Pacman is always agent 0.
     """
+    __slots__ = ('data',)
 
     ####################################################
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variable told about every call to generateSuccessor; None turns
+    # tracking off, see ExploredCounter and ExploredStates below
+    exploredTracker = None
+
+    def setExploredTracker(tracker):
+        GameState.exploredTracker = tracker
+    setExploredTracker = staticmethod(setExploredTracker)
 
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
-        GameState.explored = set()
-        return tmp
+        """
+        Returns the set of states the current tracker has recorded since the
+        last call and starts it over.  The set is empty when tracking is off
+        or the tracker keeps no states; ExploredCounter's calls are read with
+        its getCount.
+        """
+        if GameState.exploredTracker is None:
+            return set()
+        return GameState.exploredTracker.getAndReset()
     getAndResetExplored = staticmethod(getAndResetExplored)
 
     def getLegalActions(self, agentIndex=0):
         """
         Returns the legal actions for the agent specified.
         """
-#        GameState.explored.add(self)
         if self.isWin() or self.isLose():
             return []
 
         if agentIndex == 0:  # Pacman is moving
-            return PacmanRules.getLegalActions(self)
+            return list(PacmanRules.getLegalActions(self))
         else:
-            return GhostRules.getLegalActions(self, agentIndex)
+            return list(GhostRules.getLegalActions(self, agentIndex))
 
     def generateSuccessor(self, agentIndex, action):
         """
@@ -109,30 +121,48 @@ class GameState:
 
         # Copy current state
         state = GameState(self)
-
-        # Let agent's logic deal with its action's effects on the board
-        if agentIndex == 0:  # Pacman is moving
-            state.data._eaten = [False for i in range(state.getNumAgents())]
-            PacmanRules.applyAction(state, action)
-        else:                # A ghost is moving
-            GhostRules.applyAction(state, action, agentIndex)
-
-        # Time passes
-        if agentIndex == 0:
-            state.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
-        else:
-            GhostRules.decrementTimer(state.data.agentStates[agentIndex])
-
-        # Resolve multi-agent effects
-        GhostRules.checkDeath(state, agentIndex)
-
-        # Book keeping
-        state.data._agentMoved = agentIndex
-        state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        state.resolveMove(agentIndex, action)
+        if GameState.exploredTracker is not None:
+            GameState.exploredTracker.record(self, state)
         return state
 
+    def applyMove(self, agentIndex, action):
+        """
+        Changes this state in place into generateSuccessor(agentIndex, action)
+        and returns an undo record for undoMove.
+
+        A depth-first search can walk the game tree on a single state this
+        way, undoing each move on its way back up, instead of allocating a
+        state per node.  The record keeps references to the parts of the
+        state the move replaces (agent states, food, capsules, score, hash
+        and flags).  States generated from this one are not affected, but
+        moves made this way are not seen by the exploredTracker.
+        """
+        if self.isWin() or self.isLose():
+            raise Exception('Can\'t apply a move to a terminal state.')
+        data = self.data
+        undo = (data.agentStates[:], data.food, data.capsules, data._foodList,
+                data._numFood, data.score, data.scoreChange, data._hash, data._eaten,
+                data._agentMoved, data._foodEaten, data._foodAdded, data._capsuleEaten)
+        data.scoreChange = 0
+        data._foodEaten = None
+        data._foodAdded = None
+        data._capsuleEaten = None
+        self.resolveMove(agentIndex, action)
+        return undo
+
+    def undoMove(self, undo):
+        """
+        Takes back the move applyMove returned the undo record for.  Moves
+        must be undone in the reverse order they were applied.
+        """
+        data = self.data
+        (data.agentStates, data.food, data.capsules, data._foodList,
+         data._numFood, data.score, data.scoreChange, data._hash, data._eaten,
+         data._agentMoved, data._foodEaten, data._foodAdded, data._capsuleEaten) = undo
+        data._lose = False
+        data._win = False
+
     def getLegalPacmanActions(self):
         return self.getLegalActions(0)
 
@@ -155,12 +185,19 @@ class GameState:
         return self.data.agentStates[0].getPosition()
 
     def getGhostStates(self):
-        return self.data.agentStates[1:]
+        """
+        Returns copies of the ghosts' AgentStates.  The state's own are
+        shared with other states, so they are not handed out to be changed.
+        """
+        return [s.copy() for s in self.data.agentStates[1:]]
 
     def getGhostState(self, agentIndex):
+        """
+        Returns a copy of a ghost's AgentState, as getGhostStates does.
+        """
         if agentIndex == 0 or agentIndex >= self.getNumAgents():
             raise Exception("Invalid index passed to getGhostState")
-        return self.data.agentStates[agentIndex]
+        return self.data.agentStates[agentIndex].copy()
 
     def getGhostPosition(self, agentIndex):
         if agentIndex == 0:
@@ -168,7 +205,7 @@ class GameState:
         return self.data.agentStates[agentIndex].getPosition()
 
     def getGhostPositions(self):
-        return [s.getPosition() for s in self.getGhostStates()]
+        return [s.getPosition() for s in self.data.agentStates[1:]]
 
     def getNumAgents(self):
         return len(self.data.agentStates)
@@ -178,12 +215,21 @@ class GameState:
 
     def getCapsules(self):
         """
-        Returns a list of positions (x,y) of the remaining capsules.
+        Returns a list of positions (x,y) of the remaining capsules.  The list
+        is a copy, since the state's own is shared with other states.
         """
-        return self.data.capsules
+        return self.data.capsules[:]
 
     def getNumFood(self):
-        return self.data.food.count()
+        return self.data._numFood
+
+    def getFoodList(self):
+        """
+        Returns a tuple of the (x,y) positions of the remaining food, in the
+        same order as getFood().asList().  It is kept up to date as food is
+        eaten, so reading it does not scan the board.
+        """
+        return self.data._foodList
 
     def getFood(self):
         """
@@ -215,6 +261,14 @@ class GameState:
     def hasWall(self, x, y):
         return self.data.layout.walls[x][y]
 
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the number of steps on the shortest path through the maze
+        between two positions.  The all-pairs table behind it is computed
+        once per layout, on first use, and shared by every game on it.
+        """
+        return self.data.layout.getMazeDistance(pos1, pos2)
+
     def isLose(self):
         return self.data._lose
 
@@ -235,11 +289,45 @@ class GameState:
         else:
             self.data = GameStateData()
 
+    def resolveMove(self, agentIndex, action):
+        """
+        Applies the rules for the agent taking the action to this state, which
+        starts out as a copy of the state before the move.
+        """
+        # Let agent's logic deal with its action's effects on the board
+        if agentIndex == 0:  # Pacman is moving
+            self.data._eaten = [False for i in range(self.getNumAgents())]
+            PacmanRules.applyAction(self, action)
+        else:                # A ghost is moving
+            GhostRules.applyAction(self, action, agentIndex)
+
+        # Time passes
+        if agentIndex == 0:
+            self.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
+        else:
+            self.data._hash ^= self.data.agentHash(agentIndex)
+            GhostRules.decrementTimer(self.data.agentStates[agentIndex])
+            self.data._hash ^= self.data.agentHash(agentIndex)
+
+        # Resolve multi-agent effects
+        GhostRules.checkDeath(self, agentIndex)
+
+        # Book keeping
+        self.data._agentMoved = agentIndex
+        self.data.score += self.data.scoreChange
+
     def deepCopy(self):
         state = GameState(self)
         state.data = self.data.deepCopy()
         return state
 
+    def makeReadOnlyView(self):
+        """
+        Returns a GameStateView of this state: an observation for agents
+        that is made without copying the board.
+        """
+        return GameStateView(self)
+
     def __eq__(self, other):
         """
         Allows two states to be compared.
@@ -262,6 +350,70 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
 
+class GameStateView(GameState):
+    """
+    A read-only view of a GameState, shared with the state it was made from.
+
+    The accessors and generateSuccessor only read a state, so agents can
+    use a view like any GameState; successors are ordinary GameStates.
+    view.data holds read-only copies of the food grid and the agent states,
+    which raise an exception if changed in place (getFood returns an
+    ordinary copy of the grid), and assigning to its attributes first gives
+    it ordinary copies (see game.ReadOnlyGameStateData), so the original
+    state never changes.
+    """
+    __slots__ = ()
+
+    def __init__(self, state):
+        self.data = state.data.readOnlyCopy()
+
+    def getFood(self):
+        return self.data.food.copy()
+
+
+class ExploredCounter:
+    """
+    An exploration tracker that only counts calls to generateSuccessor.  It
+    neither hashes nor keeps the states it is told about.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def record(self, state, successor):
+        self.count += 1
+
+    def getCount(self):
+        return self.count
+
+    def getAndReset(self):
+        """
+        Starts the count over.  No states are kept, so the set returned is
+        always empty.
+        """
+        self.count = 0
+        return set()
+
+
+class ExploredStates:
+    """
+    An exploration tracker that keeps the set of distinct states that were
+    expanded or generated by generateSuccessor.  The autograder uses it to
+    check how many states a search agent explores.
+    """
+
+    def __init__(self):
+        self.states = set()
+
+    def record(self, state, successor):
+        self.states.add(state)
+        self.states.add(successor)
+
+    def getAndReset(self):
+        states = self.states
+        self.states = set()
+        return states
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -282,13 +434,28 @@ class ClassicGameRules:
 
     def __init__(self, timeout=30):
         self.timeout = timeout
+        # A searchStats.SearchStats to collect the agents' search statistics
+        self.stats = None
 
-    def newGame(self, layout, pacmanAgent, ghostAgents, display, quiet=False, catchExceptions=False):
+    def newGame(self, layout, pacmanAgent, ghostAgents, display, quiet=False, catchExceptions=False,
+                readOnlyObservations=False):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = GameState()
         initState.initialize(layout, len(ghostAgents))
-        game = Game(agents, display, self, catchExceptions=catchExceptions)
+        game = Game(agents, display, self, catchExceptions=catchExceptions,
+                    readOnlyObservations=readOnlyObservations)
         game.state = initState
+        # Tell agents that budget their own search time how long a move, and
+        # the whole game, may take
+        for index, agent in enumerate(agents):
+            if 'setMoveTimeLimit' in dir(agent):
+                agent.setMoveTimeLimit(
+                    min(self.getMoveTimeout(index), self.getMoveWarningTime(index)),
+                    self.getMaxTotalTime(index))
+            if self.stats is not None and 'setSearchStats' in dir(agent):
+                agent.setSearchStats(self.stats)
+        if self.stats is not None:
+            self.stats.startGame()
         self.initialState = initState.deepCopy()
         self.quiet = quiet
         return game
@@ -306,11 +473,15 @@ class ClassicGameRules:
         if not self.quiet:
             print("Pacman emerges victorious! Score: %d" % state.data.score)
         game.gameOver = True
+        if self.stats is not None:
+            self.stats.endGame(state)
 
     def lose(self, state, game):
         if not self.quiet:
             print("Pacman died! Score: %d" % state.data.score)
         game.gameOver = True
+        if self.stats is not None:
+            self.stats.endGame(state)
 
     def getProgress(self, game):
         return float(game.state.getNumFood()) / self.initialState.getNumFood()
@@ -320,6 +491,8 @@ class ClassicGameRules:
             print("Pacman crashed")
         else:
             print("A ghost crashed")
+        if self.stats is not None:
+            self.stats.endGame(game.state)
 
     def getMaxTotalTime(self, agentIndex):
         return self.timeout
@@ -346,9 +519,9 @@ class PacmanRules:
 
     def getLegalActions(state):
         """
-        Returns a list of possible actions.
+        Returns a tuple of possible actions.
         """
-        return Actions.getPossibleActions(state.getPacmanState().configuration, state.data.layout.walls)
+        return state.data.layout.getLegalActions(state.data.agentStates[0].configuration, True)
     getLegalActions = staticmethod(getLegalActions)
 
     def applyAction(state, action):
@@ -359,12 +532,14 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.copyAgentState(0)
 
         # Update Configuration
         vector = Actions.directionToVector(action, PacmanRules.PACMAN_SPEED)
+        state.data._hash ^= state.data.agentHash(0)
         pacmanState.configuration = pacmanState.configuration.generateSuccessor(
             vector)
+        state.data._hash ^= state.data.agentHash(0)
 
         # Eat
         next = pacmanState.configuration.getPosition()
@@ -381,19 +556,25 @@ class PacmanRules:
             state.data.scoreChange += 10
             state.data.food = state.data.food.copy()
             state.data.food[x][y] = False
+            state.data._hash ^= ZOBRIST.foodKey(position)
             state.data._foodEaten = position
-            # TODO: cache numFood?
-            numFood = state.getNumFood()
-            if numFood == 0 and not state.data._lose:
+            foodList = state.data._foodList
+            i = foodList.index(position)
+            state.data._foodList = foodList[:i] + foodList[i+1:]
+            state.data._numFood -= 1
+            if state.data._numFood == 0 and not state.data._lose:
                 state.data.scoreChange += 500
                 state.data._win = True
         # Eat capsule
-        if(position in state.getCapsules()):
-            state.data.capsules.remove(position)
+        if(position in state.data.capsules):
+            state.data.capsules = [c for c in state.data.capsules if c != position]
+            state.data._hash ^= ZOBRIST.capsuleKey(position)
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range(1, len(state.data.agentStates)):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data._hash ^= state.data.agentHash(index)
+                state.data.copyAgentState(index).scaredTimer = SCARED_TIME
+                state.data._hash ^= state.data.agentHash(index)
     consume = staticmethod(consume)
 
 
@@ -408,15 +589,8 @@ class GhostRules:
         Ghosts cannot stop, and cannot turn around unless they
         reach a dead end, but can turn 90 degrees at intersections.
         """
-        conf = state.getGhostState(ghostIndex).configuration
-        possibleActions = Actions.getPossibleActions(
-            conf, state.data.layout.walls)
-        reverse = Actions.reverseDirection(conf.direction)
-        if Directions.STOP in possibleActions:
-            possibleActions.remove(Directions.STOP)
-        if reverse in possibleActions and len(possibleActions) > 1:
-            possibleActions.remove(reverse)
-        return possibleActions
+        conf = state.data.agentStates[ghostIndex].configuration
+        return state.data.layout.getLegalActions(conf, False)
     getLegalActions = staticmethod(getLegalActions)
 
     def applyAction(state, action, ghostIndex):
@@ -425,13 +599,15 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.copyAgentState(ghostIndex)
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0:
             speed /= 2.0
         vector = Actions.directionToVector(action, speed)
+        state.data._hash ^= state.data.agentHash(ghostIndex)
         ghostState.configuration = ghostState.configuration.generateSuccessor(
             vector)
+        state.data._hash ^= state.data.agentHash(ghostIndex)
     applyAction = staticmethod(applyAction)
 
     def decrementTimer(ghostState):
@@ -460,9 +636,13 @@ class GhostRules:
     def collide(state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
             state.data.scoreChange += 200
+            state.data._hash ^= state.data.agentHash(agentIndex)
+            ghostState = state.data.copyAgentState(agentIndex)
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
+            state.data._hash ^= state.data.agentHash(agentIndex)
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -552,8 +732,20 @@ def readCommand(argv):
                       help=default('Time to delay between frames; <0 means keyboard'), default=0.1)
     parser.add_option('-c', '--catchExceptions', action='store_true', dest='catchExceptions',
                       help='Turns on exception handling and timeouts during games', default=False)
-    parser.add_option('--timeout', dest='timeout', type='int',
+    parser.add_option('--timeout', dest='timeout', type='float',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--seed', dest='seed', default=None,
+                      help='Base random seed; each game gets its own seed derived from it, so games are independent')
+    parser.add_option('--workers', dest='workers', type='int', default=1,
+                      help=default('Number of processes to play seeded games in'))
+    parser.add_option('--headless', action='store_true', dest='headless',
+                      help='Play the games without any display or per-move checks, and report games per second', default=False)
+    parser.add_option('--readOnlyObservations', action='store_true', dest='readOnlyObservations',
+                      help='Hand agents read-only views of the game state instead of copies', default=False)
+    parser.add_option('--stats', dest='stats', default=None,
+                      help='Write the search statistics of the Pacman agent to this file as JSON')
+    parser.add_option('--layoutCache', dest='layoutCache',
+                      help='Directory in which to keep precomputed layout tables between runs', default=None)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -565,6 +757,8 @@ def readCommand(argv):
         random.seed('cs188')
 
     # Choose a layout
+    if options.layoutCache:
+        layout.setCacheDirectory(options.layoutCache)
     args['layout'] = layout.getLayout(options.layout)
     if args['layout'] == None:
         raise Exception("The layout " + options.layout + " cannot be found")
@@ -591,7 +785,11 @@ def readCommand(argv):
     args['ghosts'] = [ghostType(i+1) for i in range(options.numGhosts)]
 
     # Choose a display format
-    if options.quietGraphics:
+    if options.headless:
+        import textDisplay
+        args['display'] = textDisplay.NullGraphics()
+        args['headless'] = True
+    elif options.quietGraphics:
         import textDisplay
         args['display'] = textDisplay.NullGraphics()
     elif options.textGraphics:
@@ -603,6 +801,10 @@ def readCommand(argv):
         args['display'] = graphicsDisplay.PacmanGraphics(
             options.zoom, frameTime=options.frameTime)
     args['numGames'] = options.numGames
+    args['seed'] = options.seed
+    args['workers'] = options.workers
+    args['readOnlyObservations'] = options.readOnlyObservations
+    args['stats'] = options.stats
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
@@ -672,15 +874,147 @@ def replayGame(layout, actions, display):
     display.finish()
 
 
-def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30):
+def gameSeed(seed, gameNumber):
+    """
+    The random seed of one game of a seeded run.  Each game's seed depends
+    only on the run's seed and the game's number, never on the games played
+    before it.
+    """
+    return '%s:%d' % (seed, gameNumber)
+
+
+def playSeededGame(task):
+    """
+    Plays one quiet game of a seeded run with fresh copies of the agents,
+    so nothing carries over from other games.  Returns (state, moveHistory,
+    agentTimeout, agentCrashed, statsGames), the last being the games a
+    SearchStats recorded if one was asked for.  Runs in the pool processes
+    of runGames.
+    """
+    import copy
+    import textDisplay
+    layout, pacman, ghosts, seed, catchExceptions, timeout, headless, readOnlyObservations, stats = task
+    random.seed(seed)
+    rules = ClassicGameRules(timeout)
+    if stats:
+        import searchStats
+        rules.stats = searchStats.SearchStats()
+    game = rules.newGame(layout, copy.deepcopy(pacman), copy.deepcopy(ghosts),
+                         textDisplay.NullGraphics(), True, catchExceptions, readOnlyObservations)
+    if headless:
+        game.runHeadless()
+    else:
+        game.run()
+    statsGames = []
+    if rules.stats is not None:
+        statsGames = rules.stats.games
+    return game.state, game.moveHistory, game.agentTimeout, game.agentCrashed, statsGames
+
+
+def runSeededGames(layout, pacman, ghosts, numGames, seed, workers=1, catchExceptions=False, timeout=30,
+                   headless=False, readOnlyObservations=False, stats=None):
+    """
+    Plays numGames quiet games, game i seeded with gameSeed(seed, i) and
+    played by fresh copies of the agents, spread over a pool of workers
+    processes.  The results are the same whatever the number of workers.
+    Returns Game objects holding each game's final state and history.
+    With a SearchStats, the statistics of each game are added to it in
+    the order of the games.
+    """
+    tasks = [(layout, pacman, ghosts, gameSeed(seed, i), catchExceptions, timeout, headless,
+              readOnlyObservations, stats is not None)
+             for i in range(numGames)]
+    if workers > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(playSeededGame, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [playSeededGame(task) for task in tasks]
+
+    rules = ClassicGameRules(timeout)
+    games = []
+    for state, moveHistory, agentTimeout, agentCrashed, statsGames in results:
+        if stats is not None:
+            stats.games.extend(statsGames)
+        game = Game([pacman] + ghosts[:layout.getNumGhosts()], None, rules)
+        game.state = state
+        game.moveHistory = moveHistory
+        game.agentTimeout = agentTimeout
+        game.agentCrashed = agentCrashed
+        game.gameOver = True
+        games.append(game)
+    return games
+
+
+def printSummary(games):
+    """
+    Prints the scores and win rate of a list of finished games.
+    """
+    scores = [game.state.getScore() for game in games]
+    wins = [game.state.isWin() for game in games]
+    winRate = wins.count(True) / float(len(wins))
+    print('Average Score:', sum(scores) / float(len(scores)))
+    print('Scores:       ', ', '.join([str(score) for score in scores]))
+    print('Win Rate:      %d/%d (%.2f)' %
+          (wins.count(True), len(wins), winRate))
+    print('Record:       ', ', '.join(
+        [['Loss', 'Win'][int(w)] for w in wins]))
+    timeouts = [game.agentTimeout for game in games].count(True)
+    if timeouts > 0:
+        print('Timeouts:      %d/%d' % (timeouts, len(games)))
+
+
+def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30,
+             headless=False, seed=None, workers=1, readOnlyObservations=False, stats=None):
+    """
+    Plays numGames games and prints a summary of the ones past numTraining.
+
+    With headless set, the games are played by Game.runHeadless, quietly
+    and without timeouts, and the summary includes games per second.  With
+    a seed, or more than one worker, the games are played quietly by
+    runSeededGames instead, and do not depend on each other or on the
+    number of workers.  With readOnlyObservations, agents are handed
+    read-only views of the game state rather than deep copies.  With
+    stats, the name of a file, the Pacman agent's search statistics (see
+    searchStats.py) are written there as JSON after the last game.
+    """
     import __main__
     __main__.__dict__['_display'] = display
+    searchStatistics = None
+    if stats is not None:
+        import searchStats
+        searchStatistics = searchStats.SearchStats()
+
+    if seed is not None or workers > 1:
+        if numTraining > 0 or record:
+            raise Exception('Training and recording need the games to be played in order, unseeded')
+        if seed is None:
+            seed = 0
+        start = time.time()
+        games = runSeededGames(layout, pacman, ghosts, numGames, seed, workers,
+                               catchExceptions, timeout, headless, readOnlyObservations,
+                               searchStatistics)
+        if numGames > 0:
+            printSummary(games)
+            if headless:
+                elapsed = time.time() - start
+                print('Played %d games in %.2fs (%.1f games/second)' %
+                      (numGames, elapsed, numGames / elapsed))
+        if searchStatistics is not None:
+            searchStatistics.dump(stats)
+        return games
 
     rules = ClassicGameRules(timeout)
+    rules.stats = searchStatistics
     games = []
+    start = time.time()
 
     for i in range(numGames):
-        beQuiet = i < numTraining
+        beQuiet = i < numTraining or headless
         if beQuiet:
                 # Suppress output and graphics
             import textDisplay
@@ -690,13 +1024,15 @@ def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, c
             gameDisplay = display
             rules.quiet = False
         game = rules.newGame(layout, pacman, ghosts,
-                             gameDisplay, beQuiet, catchExceptions)
-        game.run()
-        if not beQuiet:
+                             gameDisplay, beQuiet, catchExceptions, readOnlyObservations)
+        if headless:
+            game.runHeadless()
+        else:
+            game.run()
+        if i >= numTraining:
             games.append(game)
 
         if record:
-            import time
             import pickle
             fname = ('recorded-game-%d' % (i + 1)) + \
                 '-'.join([str(t) for t in time.localtime()[1:6]])
@@ -706,15 +1042,13 @@ def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, c
             f.close()
 
     if (numGames-numTraining) > 0:
-        scores = [game.state.getScore() for game in games]
-        wins = [game.state.isWin() for game in games]
-        winRate = wins.count(True) / float(len(wins))
-        print('Average Score:', sum(scores) / float(len(scores)))
-        print('Scores:       ', ', '.join([str(score) for score in scores]))
-        print('Win Rate:      %d/%d (%.2f)' %
-              (wins.count(True), len(wins), winRate))
-        print('Record:       ', ', '.join(
-            [['Loss', 'Win'][int(w)] for w in wins]))
+        printSummary(games)
+        if headless:
+            elapsed = time.time() - start
+            print('Played %d games in %.2fs (%.1f games/second)' %
+                  (numGames, elapsed, numGames / elapsed))
+    if searchStatistics is not None:
+        searchStatistics.dump(stats)
 
     return games
 
@@ -0,0 +1,147 @@
+# searchStats.py
+# --------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Statistics on the work done by the search agents in multiAgents.py.
+
+  python pacman.py -p AlphaBetaAgent -a depth=3 -q -n 5 --stats stats.json
+
+attaches a SearchStats to the game rules, which hand it to every agent
+with a setSearchStats method, and writes what it collected to stats.json
+after the last game.  Nothing is collected, and nothing is slowed down,
+unless a SearchStats is attached.
+"""
+import json
+import time
+
+COUNTERS = ['expanded', 'generated', 'evaluations', 'cutoffs', 'ttHits']
+TIMERS = ['getLegalActions', 'generateSuccessor', 'evaluation']
+
+
+class SearchStats:
+    """
+    Collects counters for every move an agent searches, grouped by game.
+
+    For each move it records the number of states expanded (calls to
+    getLegalActions) and generated (calls to generateSuccessor), leaf
+    evaluations, cutoffs and transposition table hits, the effective
+    branching factor (states generated per state expanded), the depth
+    searched, and the seconds spent in getLegalActions, generateSuccessor
+    and the evaluation function as well as in the whole search.  The
+    searches make those calls through the methods below when a SearchStats
+    is attached (see MultiAgentSearchAgent.getLegalActions), so calls made
+    elsewhere, such as by ghost models, are not counted.  Neither is work
+    done in the processes of a parallel search.
+    """
+
+    def __init__(self):
+        self.games = []
+        self.moves = []
+        self.move = None
+        self.startTime = 0.0
+
+    def startGame(self):
+        """
+        Called by the rules when a new game starts.
+        """
+        self.moves = []
+
+    def endGame(self, state):
+        """
+        Called by the rules when a game ends, with its final state.
+        """
+        self.games.append({'score': state.getScore(), 'win': state.isWin(),
+                           'moves': self.moves, 'totals': self.getTotals(self.moves)})
+        self.moves = []
+
+    def startMove(self):
+        """
+        Called by an agent before it searches for a move.
+        """
+        self.move = dict([(name, 0) for name in COUNTERS] + [(name, 0.0) for name in TIMERS])
+        self.startTime = time.perf_counter()
+
+    def endMove(self, depth):
+        """
+        Called by an agent once its search for a move is over, with the depth
+        it searched to.
+        """
+        move = self.move
+        move['time'] = time.perf_counter() - self.startTime
+        move['depth'] = depth
+        move['branchingFactor'] = self.getBranchingFactor(move)
+        self.moves.append(move)
+        self.move = None
+
+    def count(self, name, n=1):
+        """
+        Adds n to a counter of the move being searched, if any.
+        """
+        if self.move is not None:
+            self.move[name] += n
+
+    def addTime(self, timer, start):
+        """
+        Adds the time since start to a timer of the move being searched.
+        """
+        if self.move is not None:
+            self.move[timer] += time.perf_counter() - start
+
+    def getLegalActions(self, gameState, agentIndex):
+        start = time.perf_counter()
+        actions = gameState.getLegalActions(agentIndex)
+        self.addTime('getLegalActions', start)
+        self.count('expanded')
+        return actions
+
+    def generateSuccessor(self, gameState, agentIndex, action):
+        start = time.perf_counter()
+        successor = gameState.generateSuccessor(agentIndex, action)
+        self.addTime('generateSuccessor', start)
+        self.count('generated')
+        return successor
+
+    def evaluate(self, evaluationFunction, gameStates, batch=False):
+        """
+        Calls evaluationFunction on gameStates, a single state or, for a
+        batch evaluation, a list of them.
+        """
+        start = time.perf_counter()
+        result = evaluationFunction(gameStates)
+        self.addTime('evaluation', start)
+        self.count('evaluations', len(gameStates) if batch else 1)
+        return result
+
+    def getBranchingFactor(self, counts):
+        if counts['expanded'] == 0:
+            return 0.0
+        return counts['generated'] / counts['expanded']
+
+    def getTotals(self, moves):
+        """
+        Sums the counters and times of a list of moves.
+        """
+        totals = dict([(name, sum([move[name] for move in moves])) for name in COUNTERS + TIMERS + ['time']])
+        totals['moves'] = len(moves)
+        totals['branchingFactor'] = self.getBranchingFactor(totals)
+        return totals
+
+    def dump(self, fileName):
+        """
+        Writes the games collected so far, and the totals over all of them,
+        to fileName as JSON.  Moves of an unfinished game are left out.
+        """
+        moves = [move for game in self.games for move in game['moves']]
+        with open(fileName, 'w') as f:
+            json.dump({'games': self.games, 'totals': self.getTotals(moves)}, f, indent=2)
@@ -641,22 +641,211 @@ def pause():
 
 # code to handle timeouts
 #
-# FIXME
-# NOTE: TimeoutFuncton is NOT reentrant.  Later timeouts will silently
-# disable earlier timeouts.  Could be solved by maintaining a global list
-# of active time outs.  Currently, questions which have test cases calling
-# this have all student code so wrapped.
+# On the main thread timeouts are enforced with SIGALRM, which also cuts
+# short blocking calls such as time.sleep or waiting on a lock.  Other
+# threads use a watchdog thread shared by the whole process.  Both keep a
+# heap of the active timeouts, so they nest.
 #
+import heapq
+import itertools
+import os
 import signal
+import threading
 import time
 
+try:
+    import ctypes
+    _PyThreadState_SetAsyncExc = ctypes.pythonapi.PyThreadState_SetAsyncExc
+except (ImportError, AttributeError):
+    _PyThreadState_SetAsyncExc = None
+
+
+def _setAsyncExc(threadId, exceptionType):
+    """
+    Makes the thread raise exceptionType at its next bytecode, or cancels
+    its pending exception if exceptionType is None.
+    """
+    if exceptionType is not None:
+        exceptionType = ctypes.py_object(exceptionType)
+    _PyThreadState_SetAsyncExc(ctypes.c_ulong(threadId), exceptionType)
+
 
 class TimeoutFunctionException(Exception):
     """Exception to raise on a timeout"""
     pass
 
 
+class AlarmTimer:
+    """
+    Raises TimeoutFunctionException in the main thread when its timeouts
+    expire.
+
+    Each active timeout is an entry [deadline, sequence number, fired,
+    finished] in a heap ordered by deadline, and the interval timer
+    (setitimer, which takes fractions of a second) is set for the earliest
+    deadline.  The SIGALRM handler marks the expired entries, sets the timer
+    for the next deadline and raises.  A signal interrupts blocking calls,
+    so the exception is raised even while the thread sleeps or waits.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Also called in a child process after a fork, where the timer is
+        # not carried over
+        if getattr(self, 'heap', None):
+            signal.signal(signal.SIGALRM, self.previousHandler)
+        self.heap = []
+        self.sequence = itertools.count()
+        self.previousHandler = None
+
+    def start(self, timeout):
+        """
+        Starts a timeout of timeout seconds for the main thread.
+        """
+        entry = [time.monotonic() + timeout, next(self.sequence), False, False]
+        blocked = signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+        try:
+            if not self.heap:
+                self.previousHandler = signal.signal(signal.SIGALRM, self.handleAlarm)
+            heapq.heappush(self.heap, entry)
+            self.setTimer()
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
+        return entry
+
+    def stop(self, entry):
+        """
+        Ends a timeout and returns whether it expired.  On one thread
+        timeouts end in the reverse order they were started, so any timeouts
+        started after this one are over too, even if an exception kept them
+        from being stopped.
+        """
+        blocked = signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+        try:
+            for other in self.heap:
+                if other[1] >= entry[1]:
+                    other[3] = True
+            entry[3] = True
+            while self.heap and self.heap[0][3]:
+                heapq.heappop(self.heap)
+            if self.heap:
+                self.setTimer()
+            else:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, self.previousHandler)
+            return entry[2]
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
+
+    def setTimer(self):
+        # setitimer treats 0 as turning the timer off
+        signal.setitimer(signal.ITIMER_REAL, max(self.heap[0][0] - time.monotonic(), 1e-6))
+
+    def handleAlarm(self, signum, frame):
+        now = time.monotonic()
+        expired = False
+        while self.heap and (self.heap[0][3] or self.heap[0][0] <= now):
+            entry = heapq.heappop(self.heap)
+            if not entry[3]:
+                entry[2] = True
+                expired = True
+        if self.heap:
+            self.setTimer()
+        if expired:
+            raise TimeoutFunctionException()
+
+
+class Watchdog:
+    """
+    Raises TimeoutFunctionException in threads whose timeouts expire.
+
+    Each active timeout is an entry [deadline, sequence number, thread id,
+    fired, finished] in a heap ordered by deadline.  A daemon thread sleeps
+    until the earliest deadline and then sets the exception asynchronously
+    in the thread that started the timeout.  Python delivers it at the next
+    bytecode the thread runs, so a thread blocked in a single long C call,
+    such as time.sleep or waiting on a lock, only sees it when the call
+    returns.  TimeoutFunction therefore only uses it off the main thread.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Also called in a child process after a fork, where the thread and
+        # the state of the lock are not carried over
+        self.condition = threading.Condition()
+        self.heap = []
+        self.sequence = itertools.count()
+        self.thread = None
+
+    def start(self, timeout):
+        """
+        Starts a timeout of timeout seconds for the calling thread.
+        """
+        entry = [time.monotonic() + timeout, next(self.sequence), threading.get_ident(), False, False]
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='TimeoutWatchdog')
+                self.thread.daemon = True
+                self.thread.start()
+            heapq.heappush(self.heap, entry)
+            self.condition.notify()
+        return entry
+
+    def stop(self, entry):
+        """
+        Ends a timeout and returns whether it expired.  An exception that
+        has been set but not yet delivered is cancelled; the caller should
+        raise it instead.
+        """
+        with self.condition:
+            entry[4] = True
+            if entry[3]:
+                _setAsyncExc(entry[2], None)
+            return entry[3]
+
+    def run(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                while self.heap and (self.heap[0][4] or self.heap[0][0] <= now):
+                    entry = heapq.heappop(self.heap)
+                    if not entry[4]:
+                        entry[3] = True
+                        _setAsyncExc(entry[2], TimeoutFunctionException)
+                if self.heap:
+                    self.condition.wait(self.heap[0][0] - now)
+                else:
+                    self.condition.wait()
+
+
+WATCHDOG = Watchdog()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=WATCHDOG.reset)
+
+ALARM_TIMER = None
+if hasattr(signal, 'setitimer') and hasattr(signal, 'pthread_sigmask'):
+    ALARM_TIMER = AlarmTimer()
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=ALARM_TIMER.reset)
+
+
 class TimeoutFunction:
+    """
+    Wraps function so that calling it raises TimeoutFunctionException once
+    it has run for timeout seconds (which need not be whole).
+
+    Timeouts nest and work in any thread or process.  On the main thread
+    they use SIGALRM and also interrupt blocking calls.  In other threads
+    they are raised by the watchdog thread, which cannot interrupt a
+    blocking call, so the exception only comes once such a call returns.
+    Where neither is available, the time is only checked once the function
+    returns.
+    """
+
     def __init__(self, function, timeout):
         self.timeout = timeout
         self.function = function
@@ -665,23 +854,24 @@ class TimeoutFunction:
         raise TimeoutFunctionException()
 
     def __call__(self, *args, **keyArgs):
-        # If we have SIGALRM signal, use it to cause an exception if and
-        # when this function runs too long.  Otherwise check the time taken
-        # after the method has returned, and throw an exception then.
-        if hasattr(signal, 'SIGALRM'):
-            old = signal.signal(signal.SIGALRM, self.handle_timeout)
-            signal.alarm(self.timeout)
-            try:
-                result = self.function(*args, **keyArgs)
-            finally:
-                signal.signal(signal.SIGALRM, old)
-            signal.alarm(0)
+        if ALARM_TIMER is not None and threading.current_thread() is threading.main_thread():
+            timer = ALARM_TIMER
+        elif _PyThreadState_SetAsyncExc is not None:
+            timer = WATCHDOG
         else:
             startTime = time.time()
             result = self.function(*args, **keyArgs)
             timeElapsed = time.time() - startTime
             if timeElapsed >= self.timeout:
                 self.handle_timeout(None, None)
+            return result
+        entry = timer.start(self.timeout)
+        try:
+            result = self.function(*args, **keyArgs)
+        finally:
+            expired = timer.stop(entry)
+        if expired:
+            self.handle_timeout(None, None)
         return result
 
 